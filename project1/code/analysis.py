@@ -1,22 +1,135 @@
 import numpy as np
 from collections import defaultdict
-from sklearn.preprocessing import StandardScaler, MinMaxScaler, Normalizer
-from sklearn.model_selection import train_test_split as tts
-from regression import Ordinary_least_squares, Ridge, Lasso
-from resampling import NoResampling, Bootstrap, cross_validation
+from functools import partial
+from regression import Ordinary_least_squares, Ridge, Lasso, DegreeSweep, Ridge_path, Lasso_path
+from resampling import NoResampling, Bootstrap, cross_validation, leave_one_out, generalized_cross_validation, predict
+import cache
+import parallel
+import profiling
+import regression
+import resampling
+import streaming
+import terrain
 import utils
-import plot
+# plot (matplotlib) and sklearn are imported where they are used,
+# so runs not needing them start faster
 
 
-class NoneScaler(StandardScaler):
+class NoneScaler:
     """ To have option of no scaling """
+    def fit(self, x):
+        return self
+
     def transform(self, x):
         return x
 
+
+class Centering:
+    """
+    Subtracts the mean of the data it is fitted to.
+    The same as sklearn's StandardScaler(with_std=False), without importing sklearn.
+    The mean is computed in float64, and the data keeps its dtype
+    """
+    def fit(self, x):
+        self.mean_ = np.mean(x, axis=0, dtype=np.float64)
+        return self
+
+    def transform(self, x):
+        return x - self.mean_.astype(x.dtype)
+
 # Dicts converting from string to callable functions
 reg_conv = {"OLS": Ordinary_least_squares, "Ridge": Ridge, "Lasso":Lasso}
-resampling_conv = {"None": NoResampling, "Bootstrap": Bootstrap, "CV": cross_validation}
-scale_conv = {"None": NoneScaler(), "S": StandardScaler(with_std=False), "N": Normalizer(), "M": MinMaxScaler()}
+path_conv = {"Ridge": Ridge_path, "Lasso": Lasso_path}  # Methods fitting all lambdas at once
+resampling_conv = {"None": NoResampling, "Bootstrap": Bootstrap, "CV": cross_validation,
+                   "LOO": leave_one_out, "GCV": generalized_cross_validation}
+full_data_resampling = ["CV", "LOO", "GCV"]  # Resampling methods doing their own splitting
+analyses = {}  # Analysis functions run with main.py -a, by name, see register
+
+
+def register(methods=None, resampling=None, datasets=None, lambdas="first"):
+    """
+    Decorator adding an analysis function to analyses,
+    with the runtime arguments it can be used with.
+    The arguments are checked by check_args before the function is run.
+
+    Args:
+        methods, list: regression methods it can be used with. If None, all
+        resampling, list: resampling methods it can be used with. If None, all
+        datasets, list: datasets it can be used with. If None, all
+        lambdas, str: "first" if only the first lambda of -l is used,
+            "all" if it is run for every lambda
+    """
+    def decorator(func):
+        analyses[func.__name__] = {"func": func, "methods": methods, "resampling": resampling,
+                                   "datasets": datasets, "lambdas": lambdas}
+        return func
+    return decorator
+
+
+def instrument():
+    """
+    Wraps the stages of a run in profiling.timed, so their calls, time and
+    memory are counted: loading the data, creating and splitting X,
+    every resampling and regression method, and reading the terrain
+    in terrain_streaming, see main.py --profile.
+    Must be called after profiling.enable, before the run.
+    Only stages run in this process are counted.
+    """
+    global split_scale
+    utils.load_data = profiling.timed(utils.load_data)
+    utils.create_X = profiling.timed(utils.create_X)
+    split_scale = profiling.timed(split_scale)
+    streaming.accumulate = profiling.timed(streaming.accumulate)
+    for conv in [reg_conv, path_conv, resampling_conv, resampling.batched_conv, resampling.gram_conv]:
+        for key, func in conv.items():
+            conv[key] = profiling.timed(func)
+
+
+def check_args(args):
+    """
+    Checks that the analysis args.analyse can be used with the runtime arguments
+
+    Args:
+        args, argparse: runtime arguments
+    Returns:
+        errors, list: description of every argument that cannot be used
+    """
+    info = analyses[args.analyse]
+    errors = []
+    for name, arg, value in [("methods", "-m", args.method), ("resampling", "-r", args.resampling),
+                             ("datasets", "-d", args.dataset)]:
+        if info[name] is not None and value not in info[name]:
+            errors.append(f"{args.analyse} needs {arg} {' or '.join(info[name])}, not {value}")
+    return errors
+
+
+def get_scaler(name):
+    """
+    Returns a new scaler of the kind given by the -s argument.
+    sklearn is only imported for the scalers taken from it
+    """
+    if name == "None":
+        return NoneScaler()
+    if name == "S":
+        return Centering()
+    from sklearn.preprocessing import MinMaxScaler, Normalizer
+    return {"N": Normalizer, "M": MinMaxScaler}[name]()
+
+
+def train_test_split(X, z, test_size):
+    """
+    Splits X and z randomly into train and test sets.
+    Draws the same random permutation from the global random state as
+    sklearn's train_test_split, so the split is the same, without importing sklearn
+    Returns:
+        X_train, X_test, z_train, z_test, 2darrays
+    """
+    N = X.shape[0]
+    n_test = int(np.ceil(test_size * N))
+    perm = np.random.permutation(N)
+    train, test = perm[n_test:], perm[:n_test]
+    return X[train], X[test], z[train], z[test]
+
 
 def split_scale(X, z, ttsplit, scaler):
     """
@@ -26,13 +139,13 @@ def split_scale(X, z, ttsplit, scaler):
         X, 2darray: Full design matrix
         z, 2darray: dataset
         ttsplit, float: train/test split ratio
-        scaler, sklearn.preprocessing object: Is fitted to train data, scales train and test
+        scaler, scaler object, see get_scaler: Is fitted to train data, scales train and test
     Returns:
         X_train, X_test, z_train, z_test, 2darrays: Scaled train and test data
     """
 
     if ttsplit != 0:
-        X_train, X_test, z_train, z_test = tts(X, z, test_size=ttsplit)
+        X_train, X_test, z_train, z_test = train_test_split(X, z, ttsplit)
     else:
         X_train = X
         z_train = z
@@ -50,6 +163,233 @@ def split_scale(X, z, ttsplit, scaler):
     return X_train, X_test, z_train, z_test
 
 
+# Setups shared between runs, keyed by setup_key. Set to a dict by runner.py,
+# so runs on the same data only load and split it once
+setup_memo = None
+
+
+def setup_key(args, degree=True):
+    """
+    Returns the runtime arguments the setup of a run depends on.
+    If not degree, only those the data depends on.
+    """
+    key = (args.dataset, args.num_points, args.epsilon, args.seed, args.stride, args.data_file)
+    if degree:
+        key += (args.scaling, args.tts, args.polynomial[-1], args.dtype)
+    return key
+
+
+def setup(args):
+    """
+    Loads the data, and creates and splits the design matrix
+    of the largest polynomial degree.
+    The global random state is seeded with args.seed first, so the setup
+    only depends on the runtime arguments, not on earlier runs.
+    Args:
+        args, argparse: runtime arguments
+    Returns:
+        x, y, z, 2darrays: the data
+        arrays, list: full X and z, and scaled X_train, X_test, z_train, z_test
+    """
+    with utils.lock:  # Uses the global random state
+        if setup_memo is not None and setup_key(args) in setup_memo:
+            return setup_memo[setup_key(args)]
+
+        data_key = ("data",) + setup_key(args, degree=False)
+        if setup_memo is not None and data_key in setup_memo:
+            x, y, z, state = setup_memo[data_key]
+            np.random.set_state(state)
+        else:
+            np.random.seed(args.seed)
+            x, y, z = utils.load_data(args)
+            if setup_memo is not None:
+                setup_memo[data_key] = x, y, z, np.random.get_state()
+
+        X = utils.create_X(x, y, args.polynomial[-1], args.dtype)
+        arrays = (X, z, *split_scale(X, z, args.tts, get_scaler(args.scaling)))
+        if setup_memo is not None:
+            setup_memo[setup_key(args)] = x, y, z, arrays
+    return x, y, z, arrays
+
+
+def get_reg_method(args, X_train, z_train):
+    """
+    Returns the regression function used for a run
+    Without resampling, OLS and Ridge solve every polynomial degree
+    from the normal equations of the largest degree.
+    Args:
+        args, argparse: runtime arguments
+        X_train, 2darray: scaled design matrix of the largest degree
+        z_train, 2darray: scaled train data
+    Returns:
+        reg_method, callable: taking (X, z, lmb), returning beta
+    """
+    if args.resampling == "None" and args.method != "Lasso" and regression.uses_normal_equations():
+        return profiling.timed(DegreeSweep(X_train, z_train, ridge=args.method == "Ridge"), "DegreeSweep")
+    if args.method == "Lasso":
+        return partial(reg_conv["Lasso"], tol=args.tol)
+    return reg_conv[args.method]
+
+
+class LassoSteps:
+    """
+    Lasso_path with the tolerance of a run, keeping the number of steps
+    taken for each lambda by every fit, which SweepCell reports
+    """
+    def __init__(self, tol):
+        self.tol = tol
+        self.n_iters = []  # Steps for each lambda, of every fit since cleared
+
+    def __call__(self, X, z, lmbs, weights=None):
+        betas, n_iter = path_conv["Lasso"](X, z, lmbs, self.tol, return_n_iter=True, weights=weights)
+        self.n_iters.append(n_iter)
+        return betas
+
+
+def get_path_method(args):
+    """
+    Returns the function fitting the whole regularization path of a run,
+    taking (X, z, lmbs), returning betas stacked along the first axis
+    """
+    if args.method == "Lasso":
+        return LassoSteps(args.tol)
+    return path_conv[args.method]
+
+
+def uses_path(args, lmbs):
+    """
+    Returns whether a sweep over lambdas fits all of them at once,
+    with the regularization path of the method
+    """
+    return args.method in path_conv and len(lmbs) > 1
+
+
+def cell_seed(seed, p, lmb):
+    """
+    Returns the random seed of one cell in a sweep.
+    It depends only on the degree and lambda (unless the whole
+    regularization path is fitted), not on the other cells.
+    """
+    entropy = [seed, p]
+    if np.ndim(lmb) == 0:
+        entropy.append(int(np.float64(lmb).view(np.uint64)))
+    return np.random.SeedSequence(entropy).generate_state(1)[0]
+
+
+class SweepCell:
+    """
+    Fits one cell of a sweep over polynomial degrees and lambdas.
+    Every cell is seeded on its own, so the results do not depend on
+    which cells are run, in which order or in which process.
+    """
+    def __init__(self, arrays, args):
+        """
+        Args:
+            arrays, list: full X and z, and scaled X_train, X_test, z_train, z_test
+                of the largest polynomial degree
+            args, argparse: runtime arguments
+        """
+        self.X, self.z, self.X_train, self.X_test, self.z_train, self.z_test = arrays
+        self.args = args
+        regression.set_solver(args.solver)
+        self.resampl = resampling_conv[args.resampling]
+        if args.resampling == "Bootstrap" and args.boot_report:
+            self.resampl = partial(resampling_conv["Bootstrap"], report=args.boot_report)
+        self.reg_method = get_reg_method(args, self.X_train, self.z_train)
+        self.path_method = get_path_method(args) if args.method in path_conv else None
+
+    def __call__(self, p, lmb, path):
+        """
+        Returns the scores from resampling with degree p and lambda lmb.
+        If path, lmb is an array, and every score is an array over lambdas.
+        The steps the Lasso path took for each lambda are printed.
+        """
+        args = self.args
+        print("p = ", p, "" if path else f"l = {lmb}")
+        np.random.seed(cell_seed(args.seed, p, lmb))
+        # Set for every cell, as cells of runs with different solvers may share
+        # a process, and spawned processes do not inherit it
+        regression.set_solver(args.solver)
+
+        method = self.path_method if path else self.reg_method
+        l = utils.get_features(p)
+        if args.resampling not in full_data_resampling:
+            inputs = ((self.X_train[:, :l], self.X_test[:, :l]), (self.z_train, self.z_test), args.resampling_iter, lmb, method)
+        else:
+            inputs = (self.X[:, :l], self.z, args.resampling_iter, lmb, method)
+        if isinstance(method, LassoSteps):
+            method.n_iters.clear()
+        data = self.resampl(*inputs)
+        if isinstance(method, LassoSteps):
+            n_iters = np.array(method.n_iters)
+            print(f"p = {p}, Lasso steps for each lambda, mean and max of {len(n_iters)} fits:\n",
+                  np.round(np.mean(n_iters, axis=0), 1), "\n", np.max(n_iters, axis=0))
+        return {key: value for key, value in data.items() if key != "beta"}
+
+
+def sweep(args, arrays, lmbs):
+    """
+    Fits every combination of polynomial degree in args.polynomial and lambda
+    in lmbs, in args.jobs processes.
+    If args.cache_dir is set, cells computed before are read from the cache,
+    and the rest are stored in it.
+    Args:
+        args, argparse: runtime arguments
+        arrays, list: full X and z, and scaled X_train, X_test, z_train, z_test
+            of the largest polynomial degree
+        lmbs, array-like: lambda-parameters
+    Returns:
+        results, dict: scores from the resampling method, as (degrees, lambdas) arrays
+    """
+    P = args.polynomial
+    lmbs = np.asarray(lmbs)
+    path = uses_path(args, lmbs)
+    # The warm-started Lasso path depends on every lambda in it
+    path_lmbs = lmbs if path and args.method == "Lasso" else None
+
+    keys = {}
+    datas = []
+    cells = []
+    tasks = []
+    for i, p in enumerate(P):
+        todo = []
+        for k, lmb in enumerate(lmbs):
+            data = None
+            if args.cache_dir is not None:
+                keys[i, k] = cache.cell_key(args, p, lmb, path, path_lmbs)
+                data = cache.load(args.cache_dir, keys[i, k])
+            if data is None:
+                todo.append(k)
+            else:
+                datas.append(((i, k), data))
+
+        if path and todo:
+            if path_lmbs is not None:
+                todo = list(range(len(lmbs)))
+            cells.append((i, np.array(todo)))
+            tasks.append((p, lmbs[todo], True))
+        else:
+            cells.extend((i, k) for k in todo)
+            tasks.extend((p, lmbs[k], False) for k in todo)
+
+    new_datas = parallel.run(SweepCell, arrays, tasks, args.jobs, (args,))
+    datas.extend(zip(cells, new_datas))
+
+    if args.cache_dir is not None:
+        for (i, k), data in zip(cells, new_datas):
+            for j, kj in enumerate(np.atleast_1d(k)):
+                cache.store(args.cache_dir, keys[i, kj],
+                            {key: np.ravel(value)[j if path else 0] for key, value in data.items()})
+        cache.evict(args.cache_dir, args.cache_size)
+
+    results = defaultdict(lambda: np.zeros((len(P), len(lmbs)), dtype=float))
+    for (i, k), data in datas:
+        for key, value in data.items():
+            results[key][i, k] = value
+    return results
+
+
+@register()
 def simple_regression(args):
     """
     Run regression. Default analysis function
@@ -60,53 +400,35 @@ def simple_regression(args):
 
     Plot MSE for train and test as function of complexity
     """
+    import plot
     P = args.polynomial  # polynomial degrees
-    scaler = scale_conv[args.scaling]
 
-    x, y, z = utils.load_data(args)
+    x, y, z, arrays = setup(args)
+    X = arrays[0]
 
     # plot.Plot_3DDataset(x, y, z, args)
 
-    MSEs = np.zeros(len(P))
-    MSE_train = np.zeros(len(P))
-    R2s = np.zeros(len(P))
-    R2_train = np.zeros(len(P))
-
-    resampl = resampling_conv[args.resampling]
-
-    X = utils.create_X(x, y, P[-1])
-    X_train_, X_test_, z_train, z_test = split_scale(X, z, args.tts, scaler)
-
-    for i, p in enumerate(P):
-        print("p = ", p)
-
-        if args.resampling != "CV":
-            X_train = X_train_[:, :utils.get_features(p)]
-            X_test = X_test_[:, :utils.get_features(p)]
-            inputs = ((X_train, X_test), (z_train, z_test), args.resampling_iter, args.lmb[0], reg_conv[args.method])
-        else:
-            inputs = (X[:, :utils.get_features(p)], z, args.resampling_iter, args.lmb[0], reg_conv[args.method])
-        data = resampl(*inputs)
-
-        MSEs[i] = data["test_MSE"]
-        MSE_train[i] = data["train_MSE"]
-        R2s[i] = data["test_R2"]
-        R2_train[i] = data["train_R2"]
+    data = sweep(args, arrays, args.lmb[:1])
+    MSEs = data["test_MSE"][:, 0]
+    MSE_train = data["train_MSE"][:, 0]
+    R2s = data["test_R2"][:, 0]
+    R2_train = data["train_R2"][:, 0]
 
     # Plotting the error, see output folder!
     plot.Plot_error(MSE_test=MSEs, MSE_train=MSE_train, args=args)
     plot.Plot_R2(R2_test=R2s, R2_train=R2_train, args=args)
 
     if args.pred:
-        X_ = X[:, :utils.get_features(p)]
+        X_ = X[:, :utils.get_features(P[-1])]
         beta = reg_conv[args.method](X_,z)
-        plot.Plot_3DDataset(x, y, X_ @ beta, args, predict=True)
+        plot.Plot_3DDataset(x, y, predict(X_, beta), args, predict=True)
 
     if args.method == "OLS" and args.dataset == "Franke" and not args.show:
         """ For Ex1 we want to make a plot of the variance in the beta values. """
         plot.Plot_VarOLS(args)
 
 
+@register(resampling=["Bootstrap"])
 def bias_var_tradeoff(args, testing=False):
     """
     Perform bias-variance trade-off analysis
@@ -117,41 +439,28 @@ def bias_var_tradeoff(args, testing=False):
 
     Plots MSE, bias and variance for train and test as function of comlpexity
     """
+    import plot
     P = args.polynomial
-    scaler = scale_conv[args.scaling]
-
-    x, y, z = utils.load_data(args)
 
-    results = defaultdict(lambda: np.zeros(len(P), dtype=float))
-    resampl = resampling_conv[args.resampling]
-
-    X = utils.create_X(x, y, P[-1])
-    X_train_, X_test_, z_train, z_test = split_scale(X, z, args.tts, scaler)
-
-    for i, p in enumerate(P):
-        print("p = ", p)
+    x, y, z, arrays = setup(args)
 
-        if args.resampling != "CV":
-            X_train = X_train_[:, :utils.get_features(p)]
-            X_test = X_test_[:, :utils.get_features(p)]
-            inputs = ((X_train, X_test), (z_train, z_test), args.resampling_iter, args.lmb[0], reg_conv[args.method])
-        else:
-            inputs = (X[:, :utils.get_features(p)], z, args.resampling_iter, args.lmb[0], reg_conv[args.method])
-        data = resampl(*inputs)
+    data = sweep(args, arrays, args.lmb[:1])
 
-        results["test_errors"][i] = data["test_MSE"]
-        results["test_biases"][i] = data["test_bias"]
-        results["test_vars"][i] = data["test_variance"]
+    results = defaultdict(lambda: np.zeros(len(P), dtype=float))
+    results["test_errors"] = data["test_MSE"][:, 0]
+    results["test_biases"] = data["test_bias"][:, 0]
+    results["test_vars"] = data["test_variance"][:, 0]
 
-        results["train_errors"][i] = data["train_MSE"]
-        results["train_biases"][i] = data["train_bias"]
-        results["train_vars"][i] = data["train_variance"]
+    results["train_errors"] = data["train_MSE"][:, 0]
+    results["train_biases"] = data["train_bias"][:, 0]
+    results["train_vars"] = data["train_variance"][:, 0]
     if testing == False:
         plot.Plot_bias_var_tradeoff(results, args)
     else:
         return results
 
 
+@register(methods=["Ridge", "Lasso"], lambdas="all")
 def lambda_analysis(args):
     """
     Performs lambda analysis
@@ -164,36 +473,16 @@ def lambda_analysis(args):
     If too many polydegree:
     Plots a contour of MSE as function of complexity and lambda
     """
+    import plot
     P = args.polynomial
     lmbs = args.lmb
-    scaler = scale_conv[args.scaling]
-
-    x, y, z = utils.load_data(args)
-
-    results = defaultdict(lambda: np.zeros((len(P), len(lmbs)), dtype=float))
-    resampl = resampling_conv[args.resampling]
-
-    X = utils.create_X(x, y, P[-1])
-    X_train_, X_test_, z_train, z_test = split_scale(X, z, args.tts, scaler)
 
-    for i, p in enumerate(P):
-        print("p = ", p)
+    x, y, z, arrays = setup(args)
 
-        if args.resampling != "CV":
-            X_train = X_train_[:, :utils.get_features(p)]
-            X_test = X_test_[:, :utils.get_features(p)]
-        else:
-            X_ = X[:, :utils.get_features(p)]
+    data = sweep(args, arrays, lmbs)
 
-        for k, lmb in enumerate(lmbs):
-            print("    l = ", lmb)
-            if args.resampling != "CV":
-                inputs = ((X_train, X_test), (z_train, z_test), args.resampling_iter, lmb, reg_conv[args.method])
-            else:
-                inputs = (X_, z, args.resampling_iter, lmb, reg_conv[args.method])
-            data = resampl(*inputs)
-
-            results["test_MSE"][i][k] = data["test_MSE"]
+    results = defaultdict(lambda: np.zeros((len(P), len(lmbs)), dtype=float))
+    results["test_MSE"] = data["test_MSE"]
 
     r = results["test_MSE"]
     print(np.where(r == np.min(r)))
@@ -205,6 +494,7 @@ def lambda_analysis(args):
         plot.Plot_lambda(results, args)
 
 
+@register(methods=["Ridge", "Lasso"], resampling=["Bootstrap"], lambdas="all")
 def BVT_lambda(args):
     """
     Perform bias-variance trade-off analysis for different
@@ -215,37 +505,43 @@ def BVT_lambda(args):
 
     Plots MSE for test as function of complexity for different lambda-parameter
     """
+    import plot
     P = args.polynomial
     lmbs = args.lmb
-    scaler = scale_conv[args.scaling]
 
-    x, y, z = utils.load_data(args)
+    x, y, z, arrays = setup(args)
+
+    # Should be bootstrapping
+    data = sweep(args, arrays, lmbs)
 
     results = defaultdict(lambda: np.zeros((len(P), len(lmbs)), dtype=float))
-    resampl = resampling_conv[args.resampling]  # Should be bootstrapping
+    results["test_errors"] = data["test_MSE"]
+    results["test_biases"] = data["test_bias"]
+    results["test_vars"] = data["test_variance"]
 
-    X = utils.create_X(x, y, P[-1])
-    X_train_, X_test_, z_train, z_test = split_scale(X, z, args.tts, scaler)
+    plot.Plot_BVT_lambda(results, args)
 
-    for i, p in enumerate(P):
-        print("p = ", p)
 
-        if args.resampling != "CV":
-            X_train = X_train_[:, :utils.get_features(p)]
-            X_test = X_test_[:, :utils.get_features(p)]
-        else:
-            X_ = X[:, :utils.get_features(p)]
+@register(methods=["OLS", "Ridge"], datasets=["SRTM"], lambdas="all")
+def terrain_streaming(args):
+    """
+    Fits OLS/Ridge to the full SRTM terrain, out-of-core
 
-        for k, lmb in enumerate(lmbs):
-            print("    l = ", lmb)
-            if args.resampling != "CV":
-                inputs = ((X_train, X_test), (z_train, z_test), args.resampling_iter, lmb, reg_conv[args.method])
-            else:
-                inputs = (X_, z, args.resampling_iter, lmb, reg_conv[args.method])
-            data = resampl(*inputs)
+    The terrain is read args.chunk rows at a time, every args.stride'th point,
+    and the normal equations of the largest degree are accumulated.
+    Every polynomial degree and lambda is then solved from these,
+    and scored on all points. There is no resampling.
 
-            results["test_errors"][i][k] = data["test_MSE"]
-            results["test_biases"][i][k] = data["test_bias"]
-            results["test_vars"][i][k] = data["test_variance"]
+    Prints MSE and R2 for every polynomial degree and lambda
+    """
+    P = args.polynomial
+    lmbs = args.lmb if args.method == "Ridge" else [0]
 
-    plot.Plot_BVT_lambda(results, args)
+    sums = streaming.accumulate(terrain.load(utils.terrain_path(args)), P[-1], args.chunk, args.stride,
+                                dtype=args.dtype)
+
+    print(f"{'p':>4} {'lambda':>10} {'MSE':>12} {'R2':>8}")
+    for p in P:
+        for lmb in lmbs:
+            MSE, R2 = streaming.score(sums, streaming.fit(sums, p, lmb))
+            print(f"{p:>4} {lmb:>10.3g} {MSE:>12.5g} {R2:>8.4f}")
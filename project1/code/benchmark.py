@@ -0,0 +1,407 @@
+"""
+Benchmarks of the computationally heavy parts of the code.
+Run with python3 benchmark.py -h to see the options.
+"""
+import argparse
+import time
+import tracemalloc
+from functools import partial
+import numpy as np
+import analysis
+import franke
+import regression
+import resampling
+import utils
+
+
+def create_X_loop(x, y, n):
+    """
+    Reference design matrix, filling each column with fresh powers.
+    This is how utils.create_X used to be implemented.
+    """
+    x = np.ravel(x)
+    y = np.ravel(y)
+
+    N = len(x)
+    l = utils.get_features(n)
+    X = np.ones((N, l))
+
+    for i in range(1, n + 1):
+        q = i * (i + 1) // 2
+        for k in range(i + 1):
+            X[:, q + k] = (x ** (i - k)) * (y ** k)
+    return X
+
+
+def timeit(func, *args, repeat=3):
+    """
+    Returns the best wall time of repeat calls to func, and the last result
+    """
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best, res
+
+
+def traced_peak(func, *args):
+    """
+    Returns the peak memory allocated by a call to func in MB, measured with
+    tracemalloc, which numpy reports its arrays to, and the result.
+    Memory allocated before the call is not counted.
+    """
+    tracemalloc.start()
+    try:
+        res = func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return peak / 1024**2, res
+
+
+def bootstrap_OLS(x, y, z, p, dtype, B):
+    """
+    Builds the design matrix of degree p in dtype, splits and centers it,
+    and bootstraps OLS B times from seed 7132. Returns the data of Bootstrap.
+    """
+    np.random.seed(7132)
+    X = utils.create_X(x, y, p, dtype)
+    X_train, X_test, z_train, z_test = analysis.split_scale(X, z, 0.2, analysis.Centering())
+    return resampling.Bootstrap((X_train, X_test), (z_train, z_test), B, 0, regression.Ordinary_least_squares)
+
+
+def bench_create_X(args):
+    """
+    Compares utils.create_X to the column-by-column loop
+    for every combination of gridpoints and polynomial degree.
+    Combinations whose design matrix exceed the memory limit are skipped.
+    """
+    print(f"{'n':>6} {'p':>4} {'loop [s]':>10} {'cached [s]':>11} {'speedup':>8}")
+    for n in args.num_points:
+        x = np.sort(np.random.uniform(size=n))
+        y = np.sort(np.random.uniform(size=n))
+        x, y = np.meshgrid(x, y)
+        for p in args.polynomial:
+            if x.size * utils.get_features(p) * 8 > args.max_memory * 1024**2:
+                print(f"{n:>6} {p:>4} {'skipped, too large':>31}")
+                continue
+            t_loop, X_loop = timeit(create_X_loop, x, y, p, repeat=args.repeat)
+            t_new, X_new = timeit(utils.create_X, x, y, p, repeat=args.repeat)
+            assert np.allclose(X_loop, X_new), "Design matrices differ"
+            print(f"{n:>6} {p:>4} {t_loop:>10.4f} {t_new:>11.4f} {t_loop / t_new:>8.1f}")
+
+
+def bench_solvers(args):
+    """
+    Compares the OLS/Ridge solver backends in regression.solvers on the
+    centered Franke design matrix, for every combination of gridpoints and
+    polynomial degree. Reports wall time, MSE of the fit, and the relative
+    residual of the normal equations, ||X.T (z - X beta) - lambda beta|| / ||X.T z||,
+    which is 0 for the exact solution.
+    """
+    print(f"{'n':>6} {'p':>4} {'solver':>9} {'time [s]':>10} {'MSE':>12} {'residual':>10}")
+    for n in args.num_points:
+        x = np.sort(np.random.uniform(size=n))
+        y = np.sort(np.random.uniform(size=n))
+        x, y = np.meshgrid(x, y)
+        z = utils.FrankeFunction(x, y, eps=0.2)
+        z = z - np.mean(z)
+        for p in args.polynomial:
+            if x.size * utils.get_features(p) * 8 > args.max_memory * 1024**2:
+                print(f"{n:>6} {p:>4} {'skipped, too large':>33}")
+                continue
+            X = utils.create_X(x, y, p)
+            X = X - np.mean(X, axis=0)
+            XTz_norm = np.linalg.norm(X.T @ z)
+            for name, solve in regression.solvers.items():
+                t, beta = timeit(solve, X, z, args.lmb, repeat=args.repeat)
+                MSE = np.mean((z - X @ beta) ** 2)
+                res = np.linalg.norm(X.T @ (z - X @ beta) - args.lmb * beta) / XTz_norm
+                print(f"{n:>6} {p:>4} {name:>9} {t:>10.4f} {MSE:>12.6g} {res:>10.2e}")
+
+
+def bench_dtype(args):
+    """
+    Compares bootstrapped OLS with a float32 design matrix (-dtype float32)
+    to float64, for every combination of gridpoints and polynomial degree.
+    Both use the same data, split and bootstrap samples.
+    Reports wall time, the peak memory of building the design matrix and
+    bootstrapping, measured with tracemalloc in a run of its own as tracing
+    slows it down, and the relative difference of the test MSE from float64,
+    which fails the benchmark if above -tol. The bias and variance differ more for
+    ill-conditioned design matrices, so their largest difference is also shown.
+    """
+    print(f"{'n':>6} {'p':>4} {'f64 [s]':>9} {'f32 [s]':>9} {'f64 [MB]':>9} {'f32 [MB]':>9} {'MSE diff':>10} {'bias/var':>10}")
+    failed = False
+    for n in args.num_points:
+        x = np.sort(np.random.uniform(size=n))
+        y = np.sort(np.random.uniform(size=n))
+        x, y = np.meshgrid(x, y)
+        z = utils.FrankeFunction(x, y, eps=0.2)
+        for p in args.polynomial:
+            if x.size * utils.get_features(p) * 8 > args.max_memory * 1024**2:
+                print(f"{n:>6} {p:>4} {'skipped, too large':>53}")
+                continue
+            times, peaks, datas = [], [], []
+            for dtype in [np.float64, np.float32]:
+                t, data = timeit(bootstrap_OLS, x, y, z, p, dtype, args.bootstraps, repeat=args.repeat)
+                peak, _ = traced_peak(bootstrap_OLS, x, y, z, p, dtype, args.bootstraps)
+                times.append(t)
+                peaks.append(peak)
+                datas.append(data)
+            diff = {k: np.abs(datas[1][k] / datas[0][k] - 1) for k in ["test_MSE", "test_bias", "test_variance"]}
+            failed |= diff["test_MSE"] > args.tol
+            print(f"{n:>6} {p:>4} {times[0]:>9.4f} {times[1]:>9.4f} {peaks[0]:>9.1f} {peaks[1]:>9.1f} "
+                  f"{diff['test_MSE']:>10.2e} {max(diff['test_bias'], diff['test_variance']):>10.2e}")
+    assert not failed, f"float32 scores differ from float64 by more than {args.tol}"
+
+
+def bench_batched(args):
+    """
+    Compares bootstrapped OLS fitted all at once (regression.solve_batched)
+    to fitting each sample on its own with pinv, for every combination of
+    gridpoints and polynomial degree, with the same bootstrap samples.
+    Reports wall times, the share of systems solved with Cholesky instead of
+    with pinv, and the largest relative difference of the test MSE, bias and
+    variance, which fails the benchmark if above -batched-tol.
+    """
+    print(f"{'n':>6} {'p':>4} {'per-sample [s]':>15} {'batched [s]':>12} {'direct':>7} {'diff':>10}")
+    failed = False
+    for n in args.num_points:
+        x = np.sort(np.random.uniform(size=n))
+        y = np.sort(np.random.uniform(size=n))
+        x, y = np.meshgrid(x, y)
+        z = utils.FrankeFunction(x, y, eps=0.2)
+        for p in args.polynomial:
+            if x.size * utils.get_features(p) * 8 > args.max_memory * 1024**2:
+                print(f"{n:>6} {p:>4} {'skipped, too large':>46}")
+                continue
+            np.random.seed(7132)
+            X = utils.create_X(x, y, p)
+            X_train, X_test, z_train, z_test = analysis.split_scale(X, z, 0.2, analysis.Centering())
+            times, datas = [], []
+            # A partial is not in resampling.batched_conv, so each sample is fitted on its own
+            for reg_method in [partial(regression.Ordinary_least_squares), regression.Ordinary_least_squares]:
+                np.random.seed(7132)
+                t, data = timeit(resampling.Bootstrap, (X_train, X_test), (z_train, z_test),
+                                 args.bootstraps, 0, reg_method, repeat=1)
+                times.append(t)
+                datas.append(data)
+
+            # Conditioning of the systems, as in solve_batched
+            np.random.seed(7132)
+            samples = resampling.bootstrap_samples(len(z_train), args.bootstraps)
+            XTX, _ = regression.weighted_gram(X_train, z_train, samples)
+            keep = np.any(np.diagonal(XTX, axis1=1, axis2=2) > 0, axis=0)
+            _, good = regression.batched_cholesky(XTX[:, keep][:, :, keep])
+            direct = np.mean(good)
+
+            diff = max(np.abs(datas[1][k] / datas[0][k] - 1) for k in ["test_MSE", "test_bias", "test_variance"])
+            failed |= diff > args.batched_tol
+            print(f"{n:>6} {p:>4} {times[0]:>15.4f} {times[1]:>12.4f} {direct:>7.0%} {diff:>10.2e}")
+    assert not failed, f"Batched bootstrap differs from per-sample fits by more than {args.batched_tol}"
+
+
+def bench_lasso(args):
+    """
+    Compares regression.Lasso_path to SKlearn's Lasso, fitted to each lambda on its own
+    with the same tolerance, on the standardized Franke design matrix, for every
+    combination of gridpoints and polynomial degree, and -nl lambdas from 1e-6 to 1e-1.
+    Reports wall times, the largest excess of the objective of Lasso_path over
+    SKlearn's, relative to z.T z / N, and the mean and largest number of steps
+    Lasso_path took for a lambda. Both are within -lasso-tol of the optimum,
+    so this fails the benchmark if above -lasso-tol.
+    SKlearn is slow at high degrees, so use few of them.
+    """
+    import warnings
+    from sklearn.linear_model import Lasso  # sklearn is slow to import
+    lmbs = np.logspace(-6, -1, args.num_lambdas)
+    print(f"{'n':>6} {'p':>4} {'sklearn [s]':>12} {'path [s]':>9} {'speedup':>8} {'obj diff':>10} {'steps':>6} {'max':>5}")
+    failed = False
+    for n in args.num_points:
+        x = np.sort(np.random.uniform(size=n))
+        y = np.sort(np.random.uniform(size=n))
+        x, y = np.meshgrid(x, y)
+        z = utils.FrankeFunction(x, y, eps=0.2).reshape(-1, 1)
+        zz = np.mean((z - np.mean(z)) ** 2)
+        for p in args.polynomial:
+            if x.size * utils.get_features(p) * 8 > args.max_memory * 1024**2:
+                print(f"{n:>6} {p:>4} {'skipped, too large':>54}")
+                continue
+            X = utils.create_X(x, y, p)[:, 1:]
+            X = (X - np.mean(X, axis=0)) / np.std(X, axis=0)
+
+            def fit_sklearn():
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore")  # Not converged in max_iter
+                    return [Lasso(alpha=lmb, tol=args.lasso_tol, max_iter=10000).fit(X, z.ravel()).coef_
+                            for lmb in lmbs]
+
+            t_sk, betas_sk = timeit(fit_sklearn, repeat=1)
+            t_path, (betas, n_iter) = timeit(partial(regression.Lasso_path, return_n_iter=True),
+                                             X, z, lmbs, args.lasso_tol, repeat=args.repeat)
+            X_c = X - np.mean(X, axis=0)
+            z_c = np.ravel(z) - np.mean(z)
+
+            def objective(beta, lmb):
+                return np.mean((z_c - X_c @ beta) ** 2) / 2 + lmb * np.sum(np.abs(beta))
+
+            diff = max(objective(betas[i, :, 0], lmb) - objective(betas_sk[i], lmb)
+                       for i, lmb in enumerate(lmbs)) / zz
+            failed |= diff > args.lasso_tol
+            print(f"{n:>6} {p:>4} {t_sk:>12.4f} {t_path:>9.4f} {t_sk / t_path:>8.1f} {diff:>10.2e} "
+                  f"{np.mean(n_iter):>6.1f} {np.max(n_iter):>5}")
+    assert not failed, f"Lasso_path objective above SKlearn's by more than {args.lasso_tol}"
+
+
+def bench_parallel(args):
+    """
+    Compares a cross-validated Ridge sweep over polynomial degree and lambda
+    run serially to one run with -j processes, for every combination of
+    gridpoints and largest polynomial degree. The arrays of the workers are in
+    shared memory, so this checks they have the same memory order as in the
+    main process, which BLAS results depend on.
+    Fails the benchmark unless the scores are identical.
+    """
+    import main  # Prints the runtime arguments of every sweep
+    print(f"{'n':>6} {'p':>4} {'serial [s]':>11} {f'{args.jobs} jobs [s]':>12} {'identical':>10}")
+    failed = False
+    for n in args.num_points:
+        for p in args.polynomial:
+            if n**2 * utils.get_features(p) * 8 > args.max_memory * 1024**2:
+                print(f"{n:>6} {p:>4} {'skipped, too large':>34}")
+                continue
+            sweep_args = main.parse_args(["-a", "lambda_analysis", "-m", "Ridge", "-r", "CV", "-ri", "5",
+                                          "-n", str(n), "-p", str(p),
+                                          "-l", "m6,0,7", "-lc", "range", "-nocache"])
+            _, _, _, arrays = analysis.setup(sweep_args)
+            times, datas = [], []
+            for jobs in [1, args.jobs]:
+                sweep_args.jobs = jobs
+                t, data = timeit(analysis.sweep, sweep_args, arrays, sweep_args.lmb, repeat=1)
+                times.append(t)
+                datas.append(data)
+            same = datas[0].keys() == datas[1].keys() and all(np.array_equal(datas[0][k], datas[1][k]) for k in datas[0])
+            failed |= not same
+            print(f"{n:>6} {p:>4} {times[0]:>11.4f} {times[1]:>12.4f} {str(same):>10}")
+    assert not failed, f"Sweep with {args.jobs} jobs differs from the serial sweep"
+
+
+def bench_franke(args):
+    """
+    Compares franke.generate, serially and with -j processes,
+    to utils.FrankeFunction on the full meshgrid, for every number of gridpoints.
+    Checks that the noise does not depend on the chunking.
+    """
+    print(f"{'n':>6} {'meshgrid [s]':>13} {'chunked [s]':>12} {f'{args.jobs} jobs [s]':>12}")
+    for n in args.num_points:
+        x = np.sort(np.random.uniform(size=n))
+        y = np.sort(np.random.uniform(size=n))
+        X, Y = np.meshgrid(x, y)
+        t_mesh, _ = timeit(utils.FrankeFunction, X, Y, 0.2, repeat=args.repeat)
+        t_chunk, z = timeit(franke.generate, x, y, 0.2, 7132, repeat=args.repeat)
+        t_jobs, z_jobs = timeit(franke.generate, x, y, 0.2, 7132, args.jobs, max(1, n // 8), repeat=args.repeat)
+        assert np.array_equal(z, z_jobs), "Grid depends on the chunking"
+        print(f"{n:>6} {t_mesh:>13.4f} {t_chunk:>12.4f} {t_jobs:>12.4f}")
+
+
+benchmarks = {"create_X": bench_create_X, "solvers": bench_solvers, "dtype": bench_dtype, "batched": bench_batched,
+              "lasso": bench_lasso, "parallel": bench_parallel, "franke": bench_franke}
+
+
+def parse_args(args=None):
+    """
+    Uses argparse module to return an object containing
+        all runtime arguments specified in command line
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the design matrix builder, the regression solvers and float32 mode',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    add_arg = parser.add_argument
+
+    add_arg('-b', '--benchmarks',
+            type=str,
+            default="create_X,solvers",
+            help=f'Benchmarks to run, comma separated, from {list(benchmarks)}',
+            )
+
+    add_arg('-n', '--num_points',
+            type=str,
+            default="50,100,250,500,1000",
+            help='Number of gridpoints along 1 axis, comma separated',
+            )
+
+    add_arg('-p', '--polynomial',
+            type=str,
+            default="5,10,15,20,25,30",
+            help='Polynomial degrees, comma separated',
+            )
+
+    add_arg('-r', '--repeat',
+            type=int,
+            default=3,
+            help='Number of timings, the best is reported',
+            )
+
+    add_arg('-l', '--lmb',
+            type=float,
+            default=0,
+            help='Lambda-parameter used by the solvers benchmark, 0 for OLS',
+            )
+
+    add_arg('-B', '--bootstraps',
+            type=int,
+            default=100,
+            help='Number of bootstrap samples used by the dtype and batched benchmarks',
+            )
+
+    add_arg('-tol',
+            type=float,
+            default=5e-2,
+            help='Largest relative difference of float32 from float64 test MSE in the dtype benchmark',
+            )
+
+    add_arg('-batched-tol',
+            type=float,
+            default=1e-5,
+            help='Largest relative difference of the batched bootstrap from per-sample fits in the batched benchmark',
+            )
+
+    add_arg('-nl', '--num_lambdas',
+            type=int,
+            default=31,
+            help='Number of lambdas used by the lasso benchmark',
+            )
+
+    add_arg('-lasso-tol',
+            type=float,
+            default=1e-4,
+            help='Tolerance of both Lasso fits, and largest difference of their objectives, in the lasso benchmark',
+            )
+
+    add_arg('-j', '--jobs',
+            type=int,
+            default=4,
+            help='Number of processes used by the parallel and franke benchmarks',
+            )
+
+    add_arg('-mem', '--max_memory',
+            type=float,
+            default=1024,
+            help='Largest design matrix to build, in MB',
+            )
+
+    args = parser.parse_args(args)
+    args.benchmarks = args.benchmarks.split(",")
+    args.num_points = [int(i) for i in args.num_points.split(",")]
+    args.polynomial = [int(i) for i in args.polynomial.split(",")]
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for name in args.benchmarks:
+        np.random.seed(7132)
+        benchmarks[name](args)
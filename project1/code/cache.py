@@ -0,0 +1,117 @@
+"""
+On-disk cache of the scores of every cell in a sweep over
+polynomial degrees and lambdas.
+Every cell is stored in its own compressed .npz file, named by a hash of
+everything its result depends on: the data, the fitting options, the degree,
+the lambda and the code. Rerunning a sweep, or one overlapping an earlier
+sweep, then only computes the missing cells.
+The least recently used files are deleted when the cache grows too large.
+"""
+import os
+import glob
+import json
+import hashlib
+import numpy as np
+import utils
+
+# Files whose code affects the results of a sweep
+code_files = ["analysis.py", "regression.py", "resampling.py", "utils.py", "terrain.py", "franke.py"]
+# Runtime arguments affecting the results of a sweep
+arg_names = ["dataset", "num_points", "epsilon", "seed", "stride", "scaling", "tts",
+             "method", "resampling", "resampling_iter", "tol", "solver", "dtype"]
+
+_code_version = None
+
+
+def code_version():
+    """ Returns a hash of the code in code_files """
+    global _code_version
+    if _code_version is None:
+        h = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in code_files:
+            with open(os.path.join(here, name), "rb") as f:
+                h.update(f.read())
+        _code_version = h.hexdigest()
+    return _code_version
+
+
+def cell_key(args, p, lmb, path, lmbs=None):
+    """
+    Returns the key of one cell in a sweep
+
+    Args:
+        args, argparse: runtime arguments
+        p, int: polynomial degree
+        lmb, float: lambda-parameter
+        path, bool: whether the cell is fitted as part of a regularization path,
+            which is seeded differently
+        lmbs, 1darray: all lambdas of the path the cell was fitted with,
+            if the result depends on them (warm-started Lasso path)
+    Returns:
+        key, str: hex digest
+    """
+    config = {name: getattr(args, name) for name in arg_names}
+    if args.dataset == "SRTM":
+        data_file = utils.terrain_path(args)
+        config["data_file"] = [os.path.abspath(data_file), os.path.getmtime(data_file)]
+    if args.scaling == "N":
+        # Rows are normalized over all columns, so over the largest degree
+        config["max_degree"] = args.polynomial[-1]
+    config["p"] = int(p)
+    config["lmb"] = float(lmb)
+    config["path"] = bool(path)
+    if lmbs is not None:
+        config["path_lmbs"] = [float(l) for l in lmbs]
+    config["code"] = code_version()
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def load(cache_dir, key):
+    """
+    Returns the cached scores of a cell as a dict, or None if not cached.
+    Marks the cell as recently used.
+    """
+    path = os.path.join(cache_dir, key + ".npz")
+    try:
+        with np.load(path) as f:
+            data = {name: f[name][()] for name in f.files}
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return data
+
+
+def store(cache_dir, key, data):
+    """ Stores the scores of a cell, a dict of floats """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, key + ".npz")
+    # Written to a temporary file first, so readers never see half a file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **data)
+    os.replace(tmp, path)
+
+
+def evict(cache_dir, max_size):
+    """
+    Deletes the least recently used cells until the cache is at most max_size MB
+    """
+    files = []
+    for path in glob.glob(os.path.join(cache_dir, "*.npz")):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+    files.sort()
+
+    size = sum(f[1] for f in files)
+    for _, file_size, path in files:
+        if size <= max_size * 1024**2:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        size -= file_size
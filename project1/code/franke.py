@@ -0,0 +1,128 @@
+"""
+Generates the Franke function with noise on large grids, in chunks of rows.
+Every term of the Franke function is a product of a function of x and a
+function of y, so these are evaluated once per axis, and each term is
+an outer product of the two, summed into the output.
+The noise of every row is drawn from its own numpy.random.Generator,
+seeded from the seed and the row index, so the grid is the same
+however it is split into chunks, and chunks can be made by different processes.
+"""
+import numpy as np
+import parallel
+
+chunk_points = 2**20  # Number of points in a chunk made by generate
+# Coefficients of the four terms
+coefs = np.array([0.75, 0.75, 0.5, -0.2])
+
+
+def x_factors(x):
+    """ Returns the factor of each term depending on x, (4, len(x)) """
+    x = 9 * np.asarray(x, dtype=float)
+    return np.exp([-0.25 * (x - 2) ** 2, -(x + 1) ** 2 / 49.0, -(x - 7) ** 2 / 4.0, -(x - 4) ** 2])
+
+
+def y_factors(y):
+    """ Returns the factor of each term depending on y, times its coefficient, (4, len(y)) """
+    y = 9 * np.asarray(y, dtype=float)
+    return coefs[:, None] * np.exp([-0.25 * (y - 2) ** 2, -0.1 * (y + 1), -0.25 * (y - 3) ** 2, -(y - 7) ** 2])
+
+
+def noise(n, row, seed):
+    """
+    Returns the standard normal noise of a row of n points
+
+    Args:
+        n, int: number of points in the row
+        row, int: index of the row in the grid
+        seed, int: seed of the grid
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(row,)))
+    return rng.standard_normal(n)
+
+
+def chunk(x, y, start, stop, eps=0, seed=0, x_fac=None):
+    """
+    Returns rows start to stop of the Franke function on the grid of x and y
+
+    Args:
+        x, 1darray: x-values, along the rows
+        y, 1darray: y-values, one for each row
+        start, stop, int: rows to make
+        eps, float: scale of the noise
+        seed, int: seed of the noise
+        x_fac, 2darray: x_factors(x), if already computed
+    Returns:
+        z, 2darray: (stop - start, len(x)), z[i, j] = f(x[j], y[start + i]) + noise
+    """
+    if x_fac is None:
+        x_fac = x_factors(x)
+    y_fac = y_factors(y[start:stop])
+    z = np.multiply(y_fac[0, :, None], x_fac[0])
+    term = np.empty_like(z)
+    for k in range(1, len(coefs)):
+        np.multiply(y_fac[k, :, None], x_fac[k], out=term)
+        z += term
+    if eps != 0:
+        for i in range(stop - start):
+            z[i] += eps * noise(len(x), start + i, seed)
+    return z
+
+
+def iter_chunks(x, y, rows, eps=0, seed=0):
+    """
+    Iterates over the Franke function on the grid of x and y in chunks of rows.
+    Only one chunk is in memory at a time.
+
+    Args:
+        x, 1darray: x-values, along the rows
+        y, 1darray: y-values, one for each row
+        rows, int: number of rows in a chunk
+        eps, float: scale of the noise
+        seed, int: seed of the noise
+    Yields:
+        row, int: index of the first row of the chunk
+        z, 2darray: (rows, len(x)), with fewer rows at the end of the grid
+    """
+    x_fac = x_factors(x)
+    for r in range(0, len(y), rows):
+        yield r, chunk(x, y, r, min(r + rows, len(y)), eps, seed, x_fac)
+
+
+class ChunkMaker:
+    """ Makes chunks of a grid in a process of parallel.run """
+    def __init__(self, arrays, eps, seed):
+        self.x, self.y = arrays
+        self.x_fac = x_factors(self.x)
+        self.eps = eps
+        self.seed = seed
+
+    def __call__(self, start, stop):
+        return chunk(self.x, self.y, start, stop, self.eps, self.seed, self.x_fac)
+
+
+def generate(x, y, eps=0, seed=0, jobs=1, rows=None):
+    """
+    Returns the Franke function with noise on the grid of x and y,
+    as np.meshgrid(x, y). Large grids are made in chunks, by jobs processes.
+    The result does not depend on jobs or rows.
+
+    Args:
+        x, 1darray: x-values, along the rows
+        y, 1darray: y-values, one for each row
+        eps, float: scale of the noise
+        seed, int: seed of the noise
+        jobs, int: number of processes
+        rows, int: number of rows in a chunk. If None, about chunk_points points
+    Returns:
+        z, 2darray: (len(y), len(x))
+    """
+    if rows is None:
+        rows = max(1, chunk_points // max(len(x), 1))
+    tasks = [(r, min(r + rows, len(y))) for r in range(0, len(y), rows)]
+    if jobs == 1 or len(tasks) <= 1:
+        # Also inside parallel.shared_pool, which parallel.run would use
+        maker = ChunkMaker([x, y], eps, seed)
+        chunks = [maker(*task) for task in tasks]
+    else:
+        chunks = parallel.run(ChunkMaker, [x, y], tasks, jobs, args=(eps, seed))
+    return np.concatenate(chunks) if chunks else np.zeros((0, len(x)))
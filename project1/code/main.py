@@ -1,9 +1,11 @@
+import sys
 import utils
 import analysis
+import profiling
+import regression
+import startup
 import argparse
 
-utils.np.random.seed(7132)
-valid_funcs = utils.get_directly_implemented_funcs(analysis)
 
 def parameter_range(inp, method, lmb=False):
     """
@@ -46,6 +48,7 @@ def parse_args(args=None):
     add_arg("-a", "--analyse",
             type=str,
             default="simple_regression",
+            choices=list(analysis.analyses),
             help="what analysis function to run",
             )
 
@@ -92,8 +95,8 @@ def parse_args(args=None):
     add_arg('-r', '--resampling',
             type=str,
             default='None',
-            choices=['None', 'Bootstrap', 'CV'],
-            help='Resamplingmethod: NoResampling, Bootstrap, Cross_Validation.',
+            choices=['None', 'Bootstrap', 'CV', 'LOO', 'GCV'],
+            help='Resamplingmethod: NoResampling, Bootstrap, Cross_Validation, Leave-one-out, Generalized CV.',
             )
 
     add_arg("-ri", "--resampling-iter",
@@ -115,6 +118,32 @@ def parse_args(args=None):
             help='How to transform lambda input.',
             )
 
+    add_arg("-boot-report",
+            type=int,
+            default=0,
+            help="Print the bootstrap test scores every this many samples, to follow their convergence. 0 for never",
+            )
+
+    add_arg("-tol",
+            type=float,
+            default=1e-4,
+            help="Tolerance of Lasso: largest duality gap, relative to the mean of z^2 after centering",
+            )
+
+    add_arg("-solver",
+            type=str,
+            default="pinv",
+            choices=["pinv", "cholesky", "qr", "lstsq"],
+            help="Backend solving OLS and Ridge",
+            )
+
+    add_arg("-dtype", "--dtype",
+            type=str,
+            default="float64",
+            choices=["float64", "float32"],
+            help="dtype of the design matrix and predictions. X.T X and the solves are always float64",
+            )
+
     add_arg("-d", "--dataset",
             type=str,
             default="Franke",
@@ -128,6 +157,18 @@ def parse_args(args=None):
             help="Path to SRTM data file",
             )
 
+    add_arg("-stride",
+            type=int,
+            default=1,
+            help="Distance between SRTM points used, to subsample the terrain",
+            )
+
+    add_arg("-chunk",
+            type=int,
+            default=32,
+            help="Number of SRTM rows read at a time by terrain_streaming",
+            )
+
     add_arg("-e", "--epsilon",
             type=float,
             default=0.2,
@@ -164,6 +205,54 @@ def parse_args(args=None):
             dest="save",
             )
 
+    add_arg("-seed",
+            type=int,
+            default=7132,
+            help="Random seed",
+            )
+
+    add_arg("-j", "--jobs",
+            type=int,
+            default=1,
+            help="Number of processes used for sweeps over polynomial degree and lambda",
+            )
+
+    add_arg("-cache-dir",
+            type=str,
+            default=None,
+            help="Directory of the cache of sweep results, like ./../output/cache. If not given, no cache is used",
+            )
+
+    add_arg("-nocache",
+            action="store_const",
+            const=None,
+            dest="cache_dir",
+            help="Do not read or store sweep results in the cache, if given after -cache-dir",
+            )
+
+    add_arg("-cache-size",
+            type=float,
+            default=256,
+            help="Largest size of the cache in MB, least recently used results are deleted",
+            )
+
+    add_arg("--profile-startup",
+            action="store_true",
+            help="Run, and report the time spent importing each package",
+            )
+
+    add_arg("--profile",
+            action="store_true",
+            help="Count the calls, time and memory of every stage of the run, and print them at the end. "
+                 "The sweep is run in this process",
+            )
+
+    add_arg("--profile-json",
+            type=str,
+            default=None,
+            help="JSON file the counts of --profile are written to. Implies --profile",
+            )
+
     parser.set_defaults(show=False)
 
     args = parser.parse_args(args)
@@ -176,16 +265,33 @@ def parse_args(args=None):
     args.polynomial = eval(args.polynomial)
     args.lmb = eval(args.lmb)
 
+    errors = analysis.check_args(args)
+    if errors:
+        parser.error(", ".join(errors))
+    if analysis.analyses[args.analyse]["lambdas"] == "first" and len(args.lmb) > 1:
+        print(f"{args.analyse} only uses the first lambda, {args.lmb[0]}\n")
+
     return args
 
 
 def main():
+    if "--profile-startup" in sys.argv:
+        startup.profile_startup([arg for arg in sys.argv if arg != "--profile-startup"])
+        return
     args = parse_args()
-    func = args.analyse  # desired analysis function
-    if func in valid_funcs.keys():
-        valid_funcs[func](args)  #  call desired function with args
-    else:
-        print(f"{func} not a valid implemented function")
+    utils.np.random.seed(args.seed)
+    regression.set_solver(args.solver)
+    if args.profile or args.profile_json is not None:
+        if args.jobs > 1:
+            print("--profile only counts stages run in this process, using -j 1\n")
+            args.jobs = 1
+        profiling.enable()
+        analysis.instrument()
+    analysis.analyses[args.analyse]["func"](args)  # call desired function with args
+    if profiling.enabled:
+        profiling.report()
+        if args.profile_json is not None:
+            profiling.dump(args.profile_json)
 
 
 if __name__ == "__main__":
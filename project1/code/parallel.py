@@ -0,0 +1,124 @@
+"""
+Runs independent tasks on a pool of processes.
+Large arrays are placed in shared memory once, instead of being
+pickled and sent along with every task.
+"""
+from contextlib import contextmanager
+from multiprocessing import Pool, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+
+_worker = None  # Callable created in each worker process
+_shared = []    # Shared memory blocks attached to by each worker process
+_pool = None    # Pool used by every call to run, see shared_pool
+_workers = {}   # Callables created in each process of the shared pool, by shared memory names
+_max_workers = 4
+
+
+def share(arrays):
+    """
+    Copies arrays into shared memory, keeping their memory order,
+    so BLAS sees the same layout in every process.
+    Returns the shared memory blocks, which must be closed and unlinked
+    by the caller, and the specs needed to attach to them.
+    """
+    blocks = []
+    specs = []
+    for a in arrays:
+        a = np.asarray(a)
+        order = "F" if a.flags.f_contiguous and not a.flags.c_contiguous else "C"
+        shm = SharedMemory(create=True, size=max(a.nbytes, 1))
+        np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf, order=order)[...] = a
+        blocks.append(shm)
+        specs.append((shm.name, a.shape, a.dtype.str, order))
+    return blocks, specs
+
+
+def attach(specs):
+    """
+    Returns read-only arrays viewing the shared memory blocks given by specs,
+    and the blocks, which must be kept open as long as the arrays are used
+    """
+    arrays = []
+    blocks = []
+    for name, shape, dtype, order in specs:
+        shm = SharedMemory(name=name)
+        blocks.append(shm)
+        a = np.ndarray(shape, dtype=dtype, buffer=shm.buf, order=order)
+        a.flags.writeable = False
+        arrays.append(a)
+    return arrays, blocks
+
+
+def _init(factory, specs, args):
+    global _worker
+    arrays, blocks = attach(specs)
+    _shared.extend(blocks)  # Keep the blocks open as long as the worker lives
+    _worker = factory(arrays, *args)
+
+
+def _call(task):
+    return _worker(*task)
+
+
+def _call_shared(item):
+    factory, specs, args, task = item
+    key = tuple(spec[0] for spec in specs)
+    if key not in _workers:
+        # Callables of earlier calls to run are dropped, and their
+        # shared memory blocks closed once garbage collected
+        while len(_workers) >= _max_workers:
+            del _workers[next(iter(_workers))]
+        arrays, blocks = attach(specs)
+        _workers[key] = factory(arrays, *args), blocks
+    return _workers[key][0](*task)
+
+
+@contextmanager
+def shared_pool(jobs):
+    """
+    Makes every call to run inside the with-block use one pool of jobs processes.
+    run may then be called from several threads at once, and their tasks
+    share the pool.
+    """
+    global _pool
+    # Started before the pool, so the processes share it, instead of each
+    # starting its own, which would try to clean up the blocks on exit
+    resource_tracker.ensure_running()
+    with Pool(jobs) as pool:
+        _pool = pool
+        try:
+            yield pool
+        finally:
+            _pool = None
+
+
+def run(factory, arrays, tasks, jobs=1, args=()):
+    """
+    Calls factory(arrays, *args) once per process, and the returned
+    callable with every task.
+    Inside shared_pool, the shared pool is used, and jobs is ignored.
+
+    Args:
+        factory, callable: creates the worker callable. Must be picklable
+        arrays, list of ndarrays: shared between all processes
+        tasks, list of tuples: arguments to the worker callable
+        jobs, int: number of processes. If 1, everything is run serially
+        args, tuple: extra arguments to factory
+    Returns:
+        results, list: result of each task, in the order of tasks
+    """
+    if _pool is None and jobs == 1:
+        worker = factory(arrays, *args)
+        return [worker(*task) for task in tasks]
+
+    blocks, specs = share(arrays)
+    try:
+        if _pool is not None:
+            return _pool.map(_call_shared, [(factory, specs, args, task) for task in tasks], chunksize=1)
+        with Pool(jobs, initializer=_init, initargs=(factory, specs, args)) as pool:
+            return pool.map(_call, tasks, chunksize=1)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
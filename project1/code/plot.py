@@ -3,6 +3,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import sys
 import os
+import functools
 
 import matplotlib as mpl
 from mpl_toolkits.mplot3d import Axes3D
@@ -21,6 +22,18 @@ plt.rc('font', family='DejaVu Sans')
 path_plots = '../output/plots'
 
 
+def locked(func):
+    """
+    Runs a plotting function holding utils.lock,
+    as matplotlib is not thread safe
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with utils.lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
 def set_ax_info(ax, xlabel, ylabel, title=None, zlabel=None):
     """Write title and labels on an axis with the correct fontsizes.
 
@@ -67,6 +80,7 @@ def show(fig, fname, args):
         plt.clf()
 
 
+@locked
 def Plot_3DDataset(x, y, z, args, predict=False):
     """3D plot the data and saves the plot in the output folder
         Either Franke funcprint(cm.hot(0.3))tion or terrain data
@@ -111,6 +125,7 @@ def Plot_3DDataset(x, y, z, args, predict=False):
     show(fig, fname, args)
 
 
+@locked
 def Plot_error(MSE_test, MSE_train, args):
     """Plot mean square error as a function of polynomial degree
     for test and train data
@@ -173,6 +188,7 @@ def Plot_error(MSE_test, MSE_train, args):
     show(fig, fname, args)
 
 
+@locked
 def Plot_R2(R2_test, R2_train, args):
     """Plot R^2 score as a function of polynomial degree
     for test and train data
@@ -218,6 +234,7 @@ def Plot_R2(R2_test, R2_train, args):
     show(fig, fname, args)
 
 
+@locked
 def Plot_bias_var_tradeoff(datas, args):
     """Plot mean square error, variance and error as a function of polynomial degree
 
@@ -273,6 +290,7 @@ def Plot_bias_var_tradeoff(datas, args):
     show(fig, fname, args)
 
 
+@locked
 def Plot_lambda(results, args):
     """ Plot test MSE as function of lambda, for different polynomial degrees
 
@@ -315,6 +333,7 @@ def Plot_lambda(results, args):
     show(fig, fname, args)
 
 
+@locked
 def Plot_VarOLS(args):
     """Here we plot the parameters for different polynomials
     with confidence intervals.
@@ -349,6 +368,7 @@ def Plot_VarOLS(args):
         print('Plotting variance in beta: See ' + fname + '.pdf')
 
 
+@locked
 def Plot_BVT_lambda(result, args):
     """
     Plots BVT for as function of polynomial degree for different lambda
@@ -385,6 +405,7 @@ def Plot_BVT_lambda(result, args):
     show(fig, fname, args)
 
 
+@locked
 def Plot_2D_MSE(results, args):
     """
     Plots contour map of MSE as function of polynomial degree and lambda
@@ -0,0 +1,105 @@
+"""
+Counts the calls, time and memory of the stages of a run, for main.py --profile.
+Stages are wrapped in Timed by analysis.instrument. When profiling is not
+enabled, timed returns the function itself, so there is no overhead.
+Memory is traced with tracemalloc, which numpy reports its arrays to,
+and slows down the run somewhat.
+Times and memory of a stage include the stages it calls. The peak is the
+most memory allocated during a call, and the retained memory is what is
+still allocated when the calls return, like the arrays they return.
+"""
+import json
+import time
+import tracemalloc
+from functools import update_wrapper
+
+enabled = False
+stats = {}    # calls, time and memory of every stage, by name
+_frames = []  # [memory at start, peak so far] of every stage running, innermost last
+
+
+def enable():
+    """ Starts profiling, and tracing memory """
+    global enabled
+    enabled = True
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def reset():
+    """ Clears the statistics of all stages """
+    stats.clear()
+
+
+class Timed:
+    """
+    Wraps a function, adding its calls to stats.
+    Compares and hashes equal to the function, so it can be looked up
+    in the dicts of resampling.py keyed by regression methods.
+    """
+    def __init__(self, func, name):
+        update_wrapper(self, func)
+        self.func = func
+        self.name = name
+
+    def __call__(self, *args, **kwargs):
+        current, peak = tracemalloc.get_traced_memory()
+        if _frames:
+            _frames[-1][1] = max(_frames[-1][1], peak)
+        _frames.append([current, current])
+        tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            t = time.perf_counter() - t0
+            end, peak = tracemalloc.get_traced_memory()
+            start, inner_peak = _frames.pop()
+            peak = max(peak, inner_peak)
+            if _frames:
+                _frames[-1][1] = max(_frames[-1][1], peak)
+            stage = stats.setdefault(self.name, {"calls": 0, "time": 0., "retained": 0, "peak": 0})
+            stage["calls"] += 1
+            stage["time"] += t
+            stage["retained"] += max(end - start, 0)
+            stage["peak"] = max(stage["peak"], peak - start)
+
+    def __eq__(self, other):
+        return self.func == (other.func if isinstance(other, Timed) else other)
+
+    def __hash__(self):
+        return hash(self.func)
+
+    def __repr__(self):
+        return f"Timed({self.func!r})"
+
+
+def timed(func, name=None):
+    """
+    Returns func wrapped in Timed if profiling is enabled, else func
+
+    Args:
+        func, callable: function to profile
+        name, str: name of the stage. If None, the name of func
+    """
+    if not enabled or isinstance(func, Timed):
+        return func
+    if name is None:
+        name = getattr(func, "__name__", type(func).__name__)
+    return Timed(func, name)
+
+
+def report():
+    """ Prints the statistics of every stage, the slowest first """
+    print(f"{'stage':>32} {'calls':>7} {'time [s]':>9} {'per call [ms]':>14} "
+          f"{'retained [MB]':>14} {'peak [MB]':>10}")
+    for name, stage in sorted(stats.items(), key=lambda item: -item[1]["time"]):
+        print(f"{name:>32} {stage['calls']:>7} {stage['time']:>9.3f} "
+              f"{1e3 * stage['time'] / stage['calls']:>14.3f} "
+              f"{stage['retained'] / 1024**2:>14.1f} {stage['peak'] / 1024**2:>10.1f}")
+
+
+def dump(path):
+    """ Writes the statistics of every stage to the JSON file path, memory in bytes """
+    with open(path, "w") as f:
+        json.dump(stats, f, indent=1)
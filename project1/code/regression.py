@@ -1,46 +1,736 @@
+import warnings
 import numpy as np
-from sklearn import linear_model
 
 
-def Ordinary_least_squares(X, z, lmb=0):
+def gram(X, z, rows=4096, weights=None):
     """
-    Performs OLS regression
+    Computes X.T @ X and X.T @ z in float64, or X.T W X and X.T W z
+    with the rows weighted by weights, like bootstrap counts.
+    A float32 or weighted X is converted rows rows at a time, so the products
+    are accumulated in float64 without a copy of all of X.
+
+    Args:
+        X, 2darray: design matrix, (N, p)
+        z, 1darray or 2darray: datapoints, (N,) or (N, c)
+        rows, int: number of rows converted at a time
+        weights, 1darray: weight of each row, (N,). If None, all are 1
+    Returns:
+        XTX, 2darray: (p, p)
+        XTz, 1darray or 2darray: (p,) or (p, c)
+    """
+    if X.dtype == np.float64 and weights is None:
+        return X.T @ X, X.T @ z
+    XTX = np.zeros((X.shape[1], X.shape[1]))
+    XTz = np.zeros((X.shape[1], *np.shape(z)[1:]))
+    for r in range(0, X.shape[0], rows):
+        X_r = X[r: r + rows].astype(np.float64)
+        z_r = z[r: r + rows]
+        if weights is not None:
+            w_r = weights[r: r + rows]
+            z_r = z_r * w_r.reshape(-1, *[1] * (np.ndim(z) - 1))
+            XTz += X_r.T @ z_r
+            X_r *= np.sqrt(w_r)[:, None]
+            XTX += X_r.T @ X_r
+        else:
+            XTX += X_r.T @ X_r
+            XTz += X_r.T @ z_r
+    return XTX, XTz
+
+
+def weigh_rows(X, z, weights):
+    """
+    Returns float64 sqrt(W) X and sqrt(W) z, for the solvers factorizing X.
+    Rows of weight 0 are left out, so for bootstrap counts the copy only
+    holds the rows drawn, each once.
+    """
+    if weights is None:
+        return X.astype(np.float64, copy=False), z
+    drawn = np.flatnonzero(weights)
+    sqrt_w = np.sqrt(weights[drawn])[:, None]
+    return X[drawn] * sqrt_w, z[drawn] * sqrt_w
+
+
+def solve_pinv(X, z, lmb=0, weights=None):
+    """
+    Solves the (Ridge) normal equations with the pseudoinverse, from an SVD of X.T X
+    """
+    XTX, XTz = gram(X, z, weights=weights)
+    return np.linalg.pinv(XTX + lmb * np.eye(X.shape[1])) @ XTz
+
+
+def solve_cholesky(X, z, lmb=0, weights=None, rcond=1e-10):
+    """
+    Solves the (Ridge) normal equations with a Cholesky factorization,
+    without the SVD of pinv. Falls back to solve_pinv if they are not positive
+    definite or ill-conditioned, see solve_batched.
+    """
+    XTX, XTz = gram(X, z, weights=weights)
+    return solve_batched(XTX[None], XTz[None], lmb, rcond)[0]
+
+
+def solve_qr(X, z, lmb=0, weights=None, rcond=1e-12):
+    """
+    Solves the least squares problem with a column-pivoted QR factorization of X,
+    so the condition number is not squared by forming X.T X.
+    Ridge is solved as least squares with the rows sqrt(lambda) I appended to X.
+    Columns with |R_ii| below rcond times the largest are given beta = 0.
+    """
+    from scipy.linalg import qr, solve_triangular  # scipy is slow to import
+
+    X, z = weigh_rows(X, z, weights)
+    p = X.shape[1]
+    if lmb != 0:
+        X = np.vstack([X, np.sqrt(lmb) * np.eye(p)])
+        z = np.vstack([z, np.zeros((p, z.shape[1]))])
+    Q, R, piv = qr(X, mode="economic", pivoting=True)
+    R_diag = np.abs(np.diag(R))
+    r = np.count_nonzero(R_diag > rcond * np.max(R_diag, initial=0))
+    beta = np.zeros((p, z.shape[1]))
+    beta[piv[:r]] = solve_triangular(R[:r, :r], Q[:, :r].T @ z)
+    return beta
+
+
+def solve_lstsq(X, z, lmb=0, weights=None):
+    """
+    Solves the least squares problem with LAPACK's SVD-based least squares solver on X.
+    Ridge is solved as in solve_qr.
+    """
+    X, z = weigh_rows(X, z, weights)
+    p = X.shape[1]
+    if lmb != 0:
+        X = np.vstack([X, np.sqrt(lmb) * np.eye(p)])
+        z = np.vstack([z, np.zeros((p, z.shape[1]))])
+    return np.linalg.lstsq(X, z, rcond=None)[0]
+
+
+# Backends used by Ordinary_least_squares and Ridge, chosen with set_solver
+solvers = {"pinv": solve_pinv, "cholesky": solve_cholesky, "qr": solve_qr, "lstsq": solve_lstsq}
+solver = "pinv"
+
+
+def set_solver(name):
+    """
+    Sets the backend used by Ordinary_least_squares and Ridge
+
+    Args:
+        name, str: key of solvers
+    """
+    global solver
+    if name not in solvers:
+        raise ValueError(f"Unknown solver {name}, choose from {list(solvers)}")
+    solver = name
+
+
+def uses_normal_equations():
+    """
+    Returns whether the current backend solves the normal equations.
+    Only then are OLS and Ridge solved from X.T X by the faster batched,
+    cross-validation and degree sweep solvers. The other backends work
+    on X directly, for numerical stability.
+    """
+    return solver in ("pinv", "cholesky")
+
+
+def Ordinary_least_squares(X, z, lmb=0, weights=None):
+    """
+    Performs OLS regression, with the backend set by set_solver
 
     Args:
         X, 2darray: design matrix
         z, 2darray: datapoints
         lmb, any: taken for compatibility reasons. Unused
+        weights, 1darray: weight of each row, like bootstrap counts. If None, all are 1
     Returns:
         beta, 1darray; optimal estimators
     """
-    return np.linalg.pinv(X.T @ X) @ (X.T @ z)
+    return solvers[solver](X, z, weights=weights)
 
 
-def Ridge(X, z, lmb):
+def Ridge(X, z, lmb, weights=None):
     """
-    Performs Ridge regression
+    Performs Ridge regression, with the backend set by set_solver
 
     Args:
         X, 2darray: design matrix
         z, 2darray: datapoints
         lmb, float: lambda-parameter
+        weights, 1darray: weight of each row, like bootstrap counts. If None, all are 1
     Returns:
         beta, 1darray; optimal estimators
     """
-    return np.linalg.pinv(X.T @ X + lmb * np.eye(X.shape[1])) @ X.T @ z
+    return solvers[solver](X, z, lmb, weights=weights)
+
+
+def Ridge_path(X, z, lmbs, rcond=1e-15, weights=None):
+    """
+    Performs Ridge regression for many lambdas from one thin SVD of X.
+    With X = U S V.T, beta = V diag(s / (s^2 + lambda)) U.T z,
+    so every lambda is a rescaling of the same singular vectors.
+    As with pinv, directions where s^2 + lambda is below rcond
+    times its largest value are discarded.
+
+    Args:
+        X, 2darray: design matrix
+        z, 2darray: datapoints
+        lmbs, 1darray: lambda-parameters
+        weights, 1darray: weight of each row, like bootstrap counts. If None, all are 1
+    Returns:
+        betas, 3darray; optimal estimators, stacked along the first axis
+    """
+    X, z = weigh_rows(X, z, weights)
+    U, s, Vt = np.linalg.svd(X, full_matrices=False)
+    lmbs = np.asarray(lmbs, dtype=float).reshape(-1, 1)
+    denom = s ** 2 + lmbs
+    keep = denom > rcond * np.max(denom, axis=1, keepdims=True)
+    d = np.divide(s, denom, out=np.zeros_like(denom), where=keep)
+    return Vt.T @ (d[:, :, None] * (U.T @ z))
 
 
-def Lasso(X, z, lmb):
+def Lasso(X, z, lmb, tol=1e-4, max_iter=10000, weights=None):
     """
-    Performs Lasso regression using SKlearn lineaR-model.Lasso 
+    Performs Lasso regression, see Lasso_path
 
     Args:
         X, 2darray: design matrix
         z, 2darray: datapoints
-        lmb, any: lambda-parameters
+        lmb, float: lambda-parameter
+        tol, float: tolerance of the duality gap, relative to z.T z / N
+        max_iter, int: maximum number of steps
+        weights, 1darray: weight of each row, like bootstrap counts. If None, all are 1
     Returns:
         beta, 1darray; optimal estimators
     """
-    model = linear_model.Lasso(lmb, max_iter=1e6, tol=1e-1)
-    model.fit(X, z)
-    return model.coef_.reshape(-1, 1)
+    return Lasso_path(X, z, [lmb], tol, max_iter, weights=weights)[0]
+
+
+def _lasso_objective(beta, q, c, zz, lmb):
+    """
+    Returns ||z - X beta||^2 / (2N) + lmb ||beta||_1 from the normal equations,
+    with the correlations q = c - G beta and zz = z.T z / N
+    """
+    return 0.5 * (zz - beta @ c - beta @ q) + lmb * np.sum(np.abs(beta))
+
+
+def _duality_gap(beta, q, c, zz, lmb):
+    """
+    Returns the duality gap of the Lasso objective at beta, an upper bound on
+    its distance from the optimum, as computed by SKlearn's coordinate descent
+    """
+    R2 = zz - beta @ c - beta @ q  # ||z - X beta||^2 / N
+    dual_norm = np.max(np.abs(q), initial=0)
+    const = lmb / dual_norm if dual_norm > lmb else 1
+    gap = 0.5 * R2 * (1 + const ** 2)
+    return gap + lmb * np.sum(np.abs(beta)) - const * zz + const * (beta @ c)
+
+
+def _feature_sign_step(G, c, q, beta, lmb, zz, usable, activate):
+    """
+    One step of the feature-sign search of Lee et al. (2007).
+    The nonzero coefficients are fixed to their signs, and if activate,
+    the zero coefficient violating the KKT condition |q_j| <= lmb the most
+    is added with the sign of q_j. The objective with these signs is quadratic,
+    and its minimizer is solved for exactly. The step goes to the point of
+    lowest objective on the line to it, among the minimizer and the points
+    where a coefficient crosses zero, which is then set to zero.
+    Updates beta and the correlations q = c - G beta in place.
+
+    Returns:
+        decrease, float: of the objective, 0 if the step did not decrease it
+        reached, bool: whether the minimizer was reached with the signs it
+            was solved for, so the nonzero coefficients are optimal and the
+            next step should activate
+    """
+    signs = np.sign(beta)
+    if activate:
+        violation = np.where(usable & (signs == 0), np.abs(q) - lmb, 0)
+        j = np.argmax(violation)
+        if violation[j] > 0:
+            signs[j] = np.sign(q[j])
+    A = np.flatnonzero(signs)
+    if len(A) == 0:
+        return 0, False
+
+    beta_A = beta[A]
+    G_AA = G[A[:, None], A]
+    target = np.linalg.lstsq(G_AA, c[A] - lmb * signs[A], rcond=None)[0]
+    d = target - beta_A
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_cross = -beta_A / d
+    t = np.append(t_cross[(t_cross > 0) & (t_cross < 1)], 1)
+    # Change of the objective along the line, for every candidate step
+    smooth = -(q[A] @ d) * t + 0.5 * (d @ G_AA @ d) * t ** 2
+    candidates = beta_A + t[:, None] * d
+    change = smooth + lmb * (np.sum(np.abs(candidates), axis=1) - np.sum(np.abs(beta_A)))
+    k = np.argmin(change)
+    if not change[k] < 0:
+        return 0, False
+    beta_new = candidates[k]
+    beta_new[t_cross == t[k]] = 0
+
+    # The objective is recomputed exactly, as the line is inaccurate for a near singular G
+    old = _lasso_objective(beta, q, c, zz, lmb)
+    beta[A] = beta_new
+    q_new = c - G[:, A] @ beta_new
+    decrease = old - _lasso_objective(beta, q_new, c, zz, lmb)
+    if not decrease > 0:
+        beta[A] = beta_A
+        return 0, False
+    q[:] = q_new
+    # The step may also end past points where coefficients change sign
+    return decrease, k == len(t) - 1 and np.array_equal(np.sign(beta_new), signs[A])
+
+
+def _cd_pass(G, G_diag, q, beta, idxs, lmb):
+    """
+    One pass of coordinate descent over the coefficients idxs.
+    Updates beta and the correlations q = c - G beta in place.
+    Returns the largest change of a coefficient.
+    """
+    max_change = 0
+    for j in idxs:
+        b_old = beta[j]
+        rho = q[j] + G_diag[j] * b_old
+        b_new = np.sign(rho) * max(abs(rho) - lmb, 0) / G_diag[j]
+        if b_new != b_old:
+            q -= G[j] * (b_new - b_old)
+            beta[j] = b_new
+            max_change = max(max_change, abs(b_new - b_old))
+    return max_change
+
+
+def Lasso_path(X, z, lmbs, tol=1e-4, max_iter=10000, return_n_iter=False, weights=None):
+    """
+    Performs Lasso regression for many lambdas.
+    Minimizes ||z - X beta||^2 / (2N) + lambda ||beta||_1, the same as
+    SKlearn's Lasso. As there, an intercept is fitted by centering X and z,
+    but not returned. With weights, each row counts weights times, and N is
+    their sum, so integer weights give the same fit as repeating the rows.
+
+    X.T X is computed once and shared by all lambdas. These are solved
+    from largest to smallest, each starting from the previous solution,
+    with the feature-sign search, which solves for the nonzero coefficients
+    exactly, and adds the coefficients violating the KKT conditions one at a time.
+    If it stops decreasing the objective, as it may when X.T X is near
+    singular, the fit is finished with coordinate descent over all coefficients.
+    A lambda is converged when the duality gap is below tol times z.T z / N,
+    as in SKlearn, so the objective is then within that of the optimum.
+    A RuntimeWarning is given for lambdas not converged in max_iter steps.
+
+    Args:
+        X, 2darray: design matrix
+        z, 2darray: datapoints
+        lmbs, 1darray: lambda-parameters
+        tol, float: tolerance of the duality gap, relative to z.T z / N
+        max_iter, int: maximum number of steps, feature-sign steps or
+            passes of coordinate descent, per lambda
+        return_n_iter, bool: if True, also return the number of steps
+        weights, 1darray: weight of each row, like bootstrap counts. If None, all are 1
+    Returns:
+        betas, 3darray; optimal estimators, stacked along the first axis
+        n_iter, 1darray; number of steps for each lambda, if return_n_iter
+    """
+    if weights is None:
+        N = X.shape[0]
+        X_mean = np.mean(X, axis=0, dtype=np.float64)
+        z = np.ravel(z) - np.mean(z)
+        zz = z @ z / N
+    else:
+        N = np.sum(weights)
+        X_mean = weights @ X / N
+        z = np.ravel(z) - weights @ np.ravel(z) / N
+        zz = weights @ z ** 2 / N
+    XTX, XTz = gram(X, z, weights=weights)
+    G = (XTX - N * np.outer(X_mean, X_mean)) / N
+    c = XTz / N
+
+    G_diag = np.diag(G).copy()
+    usable = G_diag > 1e-14 * max(np.max(G_diag), 1e-300)  # Constant columns stay 0
+    q = c.copy()  # Correlation of each column with the residual
+    beta = np.zeros(len(c))
+
+    lmbs = np.asarray(lmbs, dtype=float)
+    betas = np.zeros((len(lmbs), len(c), 1))
+    n_iters = np.zeros(len(lmbs), dtype=int)
+    not_converged = []
+    gap_tol = tol * zz
+    for k in np.argsort(-lmbs):
+        lmb = lmbs[k]
+        converged = _duality_gap(beta, q, c, zz, lmb) <= gap_tol
+        n_iter = 0
+        activate = False
+        while not converged and n_iter < max_iter:
+            n_iter += 1
+            decrease, reached = _feature_sign_step(G, c, q, beta, lmb, zz, usable, activate)
+            if decrease > 0:
+                activate = reached
+            elif not activate:
+                activate = True  # The nonzero coefficients are optimal, add a violator
+            else:
+                break
+            converged = _duality_gap(beta, q, c, zz, lmb) <= gap_tol
+
+        # The gap is checked once coefficients change little, as in SKlearn
+        idxs = np.flatnonzero(usable)
+        while not converged and n_iter < max_iter:
+            change = _cd_pass(G, G_diag, q, beta, idxs, lmb)
+            n_iter += 1
+            if change <= tol * np.max(np.abs(beta), initial=0) or n_iter == max_iter:
+                q = c - G @ beta  # Without the round-off of the updates
+                converged = _duality_gap(beta, q, c, zz, lmb) <= gap_tol
+
+        if not converged:
+            not_converged.append(lmb)
+        betas[k, :, 0] = beta
+        n_iters[k] = n_iter
+
+    if not_converged:
+        warnings.warn(f"Lasso did not converge in {max_iter} steps for lambda = "
+                      f"{', '.join(f'{lmb:g}' for lmb in not_converged)}, increase max_iter or tol",
+                      RuntimeWarning)
+    if return_n_iter:
+        return betas, n_iters
+    return betas
+
+
+def weighted_gram(X, z, weights):
+    """
+    Computes the normal equations for a stack of row weightings of X,
+    like bootstrap counts, without resampling X.
+    Each is computed by gram, converting and weighting rows of X a chunk at a time,
+    so the products are accumulated in float64 without a copy of all of X.
+    The weightings are taken one at a time, so they can be drawn as they
+    are used, and no (systems, N) array of weights is needed.
+
+    Args:
+        X, 2darray: design matrix, (N, p)
+        z, 2darray: datapoints, (N, 1)
+        weights, iterable of 1darrays: weights of each system, (N,) each,
+            like the rows of a 2darray, or a generator
+    Returns:
+        XTX, 3darray: X.T W X for each weighting, (systems, p, p)
+        XTz, 3darray: X.T W z for each weighting, (systems, p, 1)
+    """
+    XTX, XTz = zip(*(gram(X, z, weights=w) for w in weights))
+    return np.stack(XTX), np.stack(XTz)
+
+
+def batched_cholesky(A, rcond=1e-10):
+    """
+    Cholesky factorizes a stack of symmetric matrices at once.
+    A matrix is usable if it is positive definite, and its reciprocal
+    condition number, estimated from the diagonal of its factor L as
+    (min L_ii / max L_ii)^2, is at least rcond. The estimate costs nothing
+    beyond the factorization.
+
+    Args:
+        A, 3darray: stacked symmetric matrices, (B, p, p)
+        rcond, float: smallest estimated reciprocal condition number
+    Returns:
+        L, 3darray: lower triangular factors, (B, p, p). Only valid where good
+        good, 1darray: whether each matrix is usable, (B,)
+    """
+    good = np.ones(len(A), dtype=bool)
+    try:
+        L = np.linalg.cholesky(A)
+    except np.linalg.LinAlgError:
+        # Some are not positive definite, factorize one at a time to find them
+        L = np.zeros(A.shape)
+        for i, A_i in enumerate(A):
+            try:
+                L[i] = np.linalg.cholesky(A_i)
+            except np.linalg.LinAlgError:
+                good[i] = False
+    L_diag = np.diagonal(L, axis1=1, axis2=2)
+    good &= np.min(L_diag, axis=1) ** 2 >= rcond * np.max(L_diag, axis=1) ** 2
+    return L, good
+
+
+def solve_batched(XTX, XTz, lmb=0, rcond=1e-10):
+    """
+    Solves a stack of normal equations (XTX + lmb I) beta = XTz at once.
+    XTX + lmb I is Cholesky factorized for all systems at once, and each
+    system solved by forward and back substitution. Systems that are not
+    positive definite, or have an estimated condition number above 1 / rcond
+    (see batched_cholesky), are solved with pinv, as solve_pinv solves a
+    single system. The ill-conditioned systems thus get the same estimators
+    as when fitted one at a time with pinv, and the direct solves differ from
+    pinv by about the condition number times the machine epsilon.
+    benchmark.py -b batched checks they agree to 1e-5 on bootstrapped OLS.
+    For the direct solve, columns that are zero in every system are
+    left out and get beta = 0, as with pinv.
+
+    Args:
+        XTX, 3darray: stacked X.T X, (B, p, p)
+        XTz, 3darray: stacked X.T z, (B, p, 1)
+        lmb, float: lambda-parameter
+        rcond, float: smallest estimated reciprocal condition number solved directly
+    Returns:
+        betas, 3darray; optimal estimators, (B, p, 1)
+    """
+    from scipy.linalg import cho_solve  # scipy is slow to import
+
+    keep = np.flatnonzero(np.any(np.diagonal(XTX, axis1=1, axis2=2) > 0, axis=0))
+    if len(keep) == 0:
+        return np.zeros(XTz.shape)
+    A = XTX[:, keep[:, None], keep] + lmb * np.eye(len(keep))
+    L, good = batched_cholesky(A, rcond)
+
+    beta = np.zeros(XTz.shape)
+    for i in np.flatnonzero(good):
+        beta[i, keep] = cho_solve((L[i], True), XTz[i, keep], check_finite=False)
+    if not good.all():
+        A = XTX[~good] + lmb * np.eye(XTX.shape[-1])
+        beta[~good] = np.linalg.pinv(A) @ XTz[~good]
+    return beta
+
+
+def fold_gram(X, z, folds):
+    """
+    Computes X.T X and X.T z of the training set of every cross-validation fold.
+    The full normal equations are computed once, and the contribution
+    of each fold's test rows is subtracted from them.
+
+    Args:
+        X, 2darray: design matrix
+        z, 2darray: datapoints
+        folds, list of 1darrays: test indices of each fold
+    Returns:
+        XTX, 3darray; (folds, p, p)
+        XTz, 3darray; (folds, p, 1)
+    """
+    XTX_full, XTz_full = gram(X, z)
+    XTX = np.empty((len(folds), *XTX_full.shape))
+    XTz = np.empty((len(folds), *XTz_full.shape))
+    for i, test_inds in enumerate(folds):
+        XTX_f, XTz_f = gram(X[test_inds], z[test_inds])
+        np.subtract(XTX_full, XTX_f, out=XTX[i])
+        np.subtract(XTz_full, XTz_f, out=XTz[i])
+    return XTX, XTz
+
+
+def Ordinary_least_squares_gram(XTX, XTz, lmb=0):
+    """
+    Performs OLS regression for a stack of normal equations
+
+    Args:
+        XTX, 3darray: stacked X.T @ X
+        XTz, 3darray: stacked X.T @ z
+        lmb, any: taken for compatibility reasons. Unused
+    Returns:
+        betas, 3darray; optimal estimators, stacked along the first axis
+    """
+    return solve_batched(XTX, XTz)
+
+
+def Ridge_gram(XTX, XTz, lmb):
+    """
+    Performs Ridge regression for a stack of normal equations
+
+    Args:
+        XTX, 3darray: stacked X.T @ X
+        XTz, 3darray: stacked X.T @ z
+        lmb, float: lambda-parameter
+    Returns:
+        betas, 3darray; optimal estimators, stacked along the first axis
+    """
+    return solve_batched(XTX, XTz, lmb)
+
+
+def Ridge_path_gram(XTX, XTz, lmbs, rcond=1e-15):
+    """
+    Performs Ridge regression for many lambdas and a stack of normal equations.
+    Each X.T X is eigendecomposed once, and every lambda
+    is a rescaling of the eigenvalues.
+
+    Args:
+        XTX, 3darray: stacked X.T @ X
+        XTz, 3darray: stacked X.T @ z
+        lmbs, 1darray: lambda-parameters
+    Returns:
+        betas, 4darray; optimal estimators, (lambdas, systems, p, 1)
+    """
+    w, V = np.linalg.eigh(XTX)
+    lmbs = np.asarray(lmbs, dtype=float).reshape(-1, 1, 1)
+    denom = w + lmbs
+    keep = denom > rcond * np.max(denom, axis=-1, keepdims=True)
+    d = np.divide(1, denom, out=np.zeros_like(denom), where=keep)
+    return V @ (d[..., None] * (np.swapaxes(V, -1, -2) @ XTz))
+
+
+def Ordinary_least_squares_batched(X, z, weights, lmb=0):
+    """
+    Performs OLS regression for a stack of row weights
+
+    Args:
+        X, 2darray: design matrix
+        z, 2darray: datapoints
+        weights, iterable of 1darrays: weights of each fit, like bootstrap counts, see weighted_gram
+        lmb, any: taken for compatibility reasons. Unused
+    Returns:
+        betas, 3darray; optimal estimators, stacked along the first axis
+    """
+    return Ordinary_least_squares_gram(*weighted_gram(X, z, weights))
+
+
+def Ridge_batched(X, z, weights, lmb):
+    """
+    Performs Ridge regression for a stack of row weights
+
+    Args:
+        X, 2darray: design matrix
+        z, 2darray: datapoints
+        weights, iterable of 1darrays: weights of each fit, like bootstrap counts, see weighted_gram
+        lmb, float: lambda-parameter
+    Returns:
+        betas, 3darray; optimal estimators, stacked along the first axis
+    """
+    return Ridge_gram(*weighted_gram(X, z, weights), lmb)
+
+
+def Ridge_path_batched(X, z, weights, lmbs, rcond=1e-15):
+    """
+    Performs Ridge regression for many lambdas and a stack of row weights,
+    see Ridge_path_gram
+
+    Args:
+        X, 2darray: design matrix
+        z, 2darray: datapoints
+        weights, iterable of 1darrays: weights of each fit, like bootstrap counts, see weighted_gram
+        lmbs, 1darray: lambda-parameters
+    Returns:
+        betas, 4darray; optimal estimators, (lambdas, weights, p, 1)
+    """
+    return Ridge_path_gram(*weighted_gram(X, z, weights), lmbs, rcond)
+
+
+def Ridge_path_hat(X, z, lmbs, rcond=1e-15):
+    """
+    Fits Ridge regression on all data for many lambdas from one thin SVD of X,
+    and returns the diagonal of the hat matrix H = X (X.T X + lambda I)^-1 X.T.
+    With X = U S V.T, H = U diag(s^2 / (s^2 + lambda)) U.T.
+    Directions are discarded as in Ridge_path, so lambda = 0 gives OLS.
+
+    Args:
+        X, 2darray: design matrix
+        z, 2darray: datapoints
+        lmbs, 1darray: lambda-parameters
+    Returns:
+        z_pred, 3darray; fitted values H z, (lambdas, N, 1)
+        H_diag, 3darray; diagonal of H, (lambdas, N, 1)
+        H2_diag, 3darray; diagonal of H @ H, (lambdas, N, 1)
+        H_z_res, 3darray; H (z - z_pred), (lambdas, N, 1)
+    """
+    U, s, Vt = np.linalg.svd(X.astype(np.float64, copy=False), full_matrices=False)
+    lmbs = np.asarray(lmbs, dtype=float).reshape(-1, 1)
+    denom = s ** 2 + lmbs
+    keep = denom > rcond * np.max(denom, axis=1, keepdims=True)
+    h = np.divide(s ** 2, denom, out=np.zeros_like(denom), where=keep)
+
+    Uz = U.T @ z
+    z_pred = U @ (h[:, :, None] * Uz)
+    H_z_res = U @ ((h * (1 - h))[:, :, None] * Uz)
+    U2 = U ** 2
+    H_diag = (U2 @ h.T).T[:, :, None]
+    H2_diag = (U2 @ (h ** 2).T).T[:, :, None]
+    return z_pred, H_diag, H2_diag, H_z_res
+
+
+class DegreeSweep:
+    """
+    Solves OLS or Ridge for a sweep over polynomial degrees.
+
+    X.T @ X and X.T @ z are computed once for the design matrix of the
+    largest degree. The design matrix of a lower degree is a leading set of
+    its columns, so the normal equations are the leading blocks of these.
+    The Cholesky factor of a leading block is the leading block of the
+    Cholesky factor, so the factorization is extended with the new columns
+    as the degree grows, and a full sweep costs about one solve.
+
+    Called in place of Ordinary_least_squares or Ridge, with leading
+    column slices of the design matrix it was created from.
+    """
+    def __init__(self, X, z, ridge=False, rcond=1e-12):
+        """
+        Args:
+            X, 2darray: design matrix of the largest polynomial degree
+            z, 2darray: datapoints
+            ridge, bool: if False, lambda is ignored (OLS)
+            rcond, float: relative size of squared Cholesky pivots below
+                which the system is deemed ill-conditioned, and solved with pinv
+        """
+        self.XTX, self.XTz = gram(X, z)
+        self.ridge = ridge
+        self.rcond = rcond
+        # Columns that are all zeros, like the intercept after centering,
+        # get beta = 0, as with the pseudoinverse
+        self.keep = np.flatnonzero(np.diag(self.XTX) > 0)
+        # Number of kept columns up to and including each polynomial degree
+        n = self.XTX.shape[0]
+        degrees = np.arange(int(np.sqrt(2 * n)) + 1)
+        self.ends = np.unique(np.searchsorted(self.keep, np.minimum((degrees + 1) * (degrees + 2) // 2, n)))
+        self.factors = {}
+
+    def extend(self, lmb, m):
+        """
+        Extends the Cholesky factor for given lambda to the first m kept columns.
+        Returns False if the factor could not be extended that far.
+        """
+        from scipy.linalg import solve_triangular  # scipy is slow to import
+
+        if lmb not in self.factors:
+            n = len(self.keep)
+            A = self.XTX[np.ix_(self.keep, self.keep)] + lmb * np.eye(n)
+            # system, factor, number of factored columns, largest pivot, broken down
+            self.factors[lmb] = [A, np.zeros_like(A), 0, 0, False]
+        A, L, a, pmax, failed = self.factors[lmb]
+        if m <= a:
+            return True
+        if failed:
+            return False
+
+        # Extended one polynomial degree at a time, so the factor
+        # is the same whatever order the degrees are solved in
+        ends = self.ends[(self.ends > a) & (self.ends < m)]
+        for b in [*ends, m]:
+            L21 = solve_triangular(L[:a, :a], A[:a, a:b], lower=True).T
+            try:
+                L22 = np.linalg.cholesky(A[a:b, a:b] - L21 @ L21.T)
+            except np.linalg.LinAlgError:
+                self.factors[lmb][4] = True
+                return False
+
+            pivots = np.diag(L22) ** 2
+            pmax = max(pmax, np.max(pivots))
+            if np.min(pivots) < self.rcond * pmax:
+                self.factors[lmb][4] = True
+                return False
+
+            L[a:b, :a] = L21
+            L[a:b, a:b] = L22
+            self.factors[lmb][2:4] = b, pmax
+            a = b
+        return True
+
+    def __call__(self, X, z, lmb=0):
+        """
+        Args:
+            X, 2darray: leading columns of the design matrix
+            z, any: taken for compatibility reasons. Unused
+            lmb, float: lambda-parameter. Unused for OLS
+        Returns:
+            beta, 1darray; optimal estimators
+        """
+        l = X.shape[1]
+        lmb = lmb if self.ridge else 0
+        m = np.searchsorted(self.keep, l)  # kept columns among the first l
+
+        if not self.extend(lmb, m):
+            A = self.XTX[:l, :l] + lmb * np.eye(l)
+            return np.linalg.pinv(A) @ self.XTz[:l]
+
+        from scipy.linalg import cho_solve
+
+        L = self.factors[lmb][1]
+        beta = np.zeros((l, self.XTz.shape[1]))
+        beta[self.keep[:m]] = cho_solve((L[:m, :m], True), self.XTz[self.keep[:m]])
+        return beta
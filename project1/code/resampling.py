@@ -1,33 +1,120 @@
 from collections import defaultdict
 import numpy as np
-from sklearn.model_selection import KFold
+import regression
 import utils
 
+# Regression methods that can fit all bootstrap samples at once
+batched_conv = {regression.Ordinary_least_squares: regression.Ordinary_least_squares_batched,
+                regression.Ridge: regression.Ridge_batched,
+                regression.Ridge_path: regression.Ridge_path_batched}
+# Regression methods that can be solved from normal equations, used for
+# cross-validation by downdating X.T X and from the hat matrix
+gram_conv = {regression.Ordinary_least_squares: regression.Ordinary_least_squares_gram,
+             regression.Ridge: regression.Ridge_gram,
+             regression.Ridge_path: regression.Ridge_path_gram}
+
 # Different scoring functions
+# Predictions for several lambdas at once are stacked along leading axes.
+# Float32 predictions are scored in float64
 def MSE(y, y_pred):
-    return sum((y - y_pred) ** 2) / len(y)
+    return np.sum((y - y_pred) ** 2, axis=-2) / y.shape[0]
 
 def MSE_boot(y, y_pred):
-    return np.mean( np.mean((y - y_pred) ** 2, axis=1, keepdims=True) )
+    return np.mean((y - y_pred) ** 2, axis=(-2, -1))
 
 def R2(y, y_pred):
-    return 1 - sum((y - y_pred) ** 2) / sum((y - np.mean(y)) ** 2)
+    return 1 - np.sum((y - y_pred) ** 2, axis=-2) / np.sum((y - np.mean(y)) ** 2, axis=-2)
+
 
-def Bias(y, y_pred):
-    return np.mean( (y - np.mean(y_pred, axis=1, keepdims=True)) ** 2 )
+boot_block = 32  # Number of bootstrap samples drawn, fitted and predicted at a time, when fitted at once
 
-def Variance(y, y_pred):
-    return np.mean( np.var(y_pred, axis=1, keepdims=True) )
 
-def resample(x, z):
+class BiasVariance:
     """
-    Resamples x and z with replacement
+    Running mean and variance of the prediction of every point over
+    bootstrap samples. Samples are added a block at a time, merged with
+    Chan et al.'s update, which for one sample is Welford's.
+    Only O(points) is stored, instead of every prediction of every sample.
     """
-    N = x.shape[0]
-    idxs = np.random.randint(0, N, size=(N,))
-    x = x[idxs]
-    z = z[idxs]
-    return x, z
+    def __init__(self):
+        self.count = 0
+        self.mean = 0
+        self.M2 = 0  # Sum of squared deviations from the mean
+
+    def update(self, pred):
+        """
+        Args:
+            pred, ndarray: predictions of a block of samples, (..., points, samples)
+        """
+        b = pred.shape[-1]
+        mean_b = np.mean(pred, axis=-1, dtype=np.float64)
+        M2_b = np.sum((pred - mean_b[..., None]) ** 2, axis=-1)
+        n = self.count + b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (b / n)
+        self.M2 = self.M2 + M2_b + delta ** 2 * (self.count * b / n)
+        self.count = n
+
+    def scores(self, y):
+        """
+        Returns the MSE, bias and variance of the predictions of the samples so far.
+        MSE is bias plus variance, the mean squared error over all samples.
+
+        Args:
+            y, 2darray: datapoints, (points, 1)
+        """
+        bias = np.mean((y[:, 0] - self.mean) ** 2, axis=-1)
+        variance = np.mean(self.M2, axis=-1) / self.count
+        return bias + variance, bias, variance
+
+def predict(X, beta):
+    """
+    Returns X @ beta, in the dtype of X.
+    The estimators are solved in float64, and are converted so a
+    float32 design matrix is not converted to float64 by the product.
+    """
+    return X @ beta.astype(X.dtype, copy=False)
+
+
+def kfold_split(N, k):
+    """
+    Splits N points into k folds of consecutive points, without shuffling.
+    The first N % k folds get one point more. Same as sklearn's KFold.
+
+    Returns:
+        folds, list: (train indices, test indices) of every fold
+    """
+    inds = np.arange(N)
+    folds = []
+    for test_inds in np.array_split(inds, k):
+        train_mask = np.ones(N, dtype=bool)
+        train_mask[test_inds] = False
+        folds.append((inds[train_mask], test_inds))
+    return folds
+
+
+def bootstrap_counts(N):
+    """
+    Draws a bootstrap sample of N rows, drawn with replacement.
+    A sample is represented by how many times each row is drawn, which the
+    regression methods take as row weights, so X is never resampled.
+    Uses the same random numbers as drawing the row indices
+    with np.random.randint(0, N, size=N).
+
+    Returns:
+        counts, 1darray: (N,), how many times each row is in the sample
+    """
+    return np.bincount(np.random.randint(0, N, size=N), minlength=N)
+
+
+def bootstrap_samples(N, B):
+    """
+    Yields B bootstrap samples of N rows, see bootstrap_counts.
+    Each is drawn when the batched regression methods ask for it,
+    so only one sample is stored at a time.
+    """
+    for _ in range(B):
+        yield bootstrap_counts(N)
 
 
 def NoResampling(X, z, unused_iter_variable, lmb, reg_method, Testing=False):
@@ -42,10 +129,12 @@ def NoResampling(X, z, unused_iter_variable, lmb, reg_method, Testing=False):
             contains z_train and z_test
         unused_iter_variable, any:
             Taken for compatibility with Bootstrapping and CV. Unused
-        lmb, float:
-            lambda-parameter for Ridge and Lasso regression
+        lmb, float or 1darray:
+            lambda-parameter for Ridge and Lasso regression.
+            Array of lambdas if reg_method is a regularization path
         reg_method, callable:
-            Function object from Regression. Is one of 3 regression methods
+            Function object from Regression. Is one of 3 regression methods,
+            or a path method fitting all lambdas at once
         Testing, bool:
             If True, return more data for testing with SKlearn reasons
     Returns:
@@ -56,24 +145,26 @@ def NoResampling(X, z, unused_iter_variable, lmb, reg_method, Testing=False):
     X_train, X_test = X
     z_train, z_test = z
     beta = reg_method(X_train, z_train, lmb)
-    test_pred = X_test @ beta
-    train_pred = X_train @ beta
+    test_pred = predict(X_test, beta)
+    train_pred = predict(X_train, beta)
 
     data = defaultdict(lambda: 0)
     data["beta"] = beta
-    data["test_MSE"] = MSE(z_test, test_pred)
-    data["train_MSE"] = MSE(z_train, train_pred)
-    data["test_R2"] = R2(z_test, test_pred)
-    data["train_R2"] = R2(z_train, train_pred)
+    data["test_MSE"] = MSE(z_test, test_pred)[..., 0]
+    data["train_MSE"] = MSE(z_train, train_pred)[..., 0]
+    data["test_R2"] = R2(z_test, test_pred)[..., 0]
+    data["train_R2"] = R2(z_train, train_pred)[..., 0]
     if not Testing:
         return data
     else:
         return data, X_train, X_test, z_train, z_test, beta
 
-def Bootstrap(X, z, B, lmb, reg_method):
+def Bootstrap(X, z, B, lmb, reg_method, report=0):
     """
     Performs regression with bootstrapping. 
     X and z should be pre-split and scaled
+    The samples are drawn and fitted a block at a time, and their predictions
+    accumulated in BiasVariance, so memory does not grow with B.
 
     Args:
         X, 2tuple: 
@@ -82,10 +173,15 @@ def Bootstrap(X, z, B, lmb, reg_method):
             contains z_train and z_test
         B, int:
             Number of bootstrapping iterations
-        lmb, float:
-            lambda-parameter for Ridge and Lasso regression
+        lmb, float or 1darray:
+            lambda-parameter for Ridge and Lasso regression.
+            Array of lambdas if reg_method is a regularization path
         reg_method, callable:
-            Function object from Regression. Is one of 3 regression methods
+            Function object from Regression. Is one of 3 regression methods,
+            or a path method fitting all lambdas at once
+        report, int:
+            Print the test scores every report samples, to follow their convergence.
+            If 0, never
     Returns:
         data, dict:
             Dictionary containing train and test MSE, bias and variance.
@@ -97,28 +193,45 @@ def Bootstrap(X, z, B, lmb, reg_method):
         B = len(z_train)
 
     data = defaultdict(lambda:0)
-    test_pred = np.empty((z_test.shape[0], B))
-    train_pred = np.empty((z_train.shape[0], B))
-
-    for i in range(B):
-        x, z = resample(X_train, z_train)
-        beta = reg_method(x, z, lmb)
-        test_pred[:, i] = (X_test @ beta).ravel()
-        train_pred[:, i] = (X_train @ beta).ravel()
-
-    data["test_MSE"] = MSE_boot(z_test, test_pred)
-    data["test_bias"] = Bias(z_test, test_pred)
-    data["test_variance"] = Variance(z_test, test_pred)
-
-    data["train_MSE"] = MSE_boot(z_train, train_pred)
-    data["train_bias"] = Bias(z_train, train_pred)
-    data["train_variance"] = Variance(z_train, train_pred)
+    test = BiasVariance()
+    train = BiasVariance()
+
+    def update(test_pred, train_pred):
+        reported = test.count // report if report else 0
+        test.update(test_pred)
+        train.update(train_pred)
+        if report and test.count // report > reported:
+            MSE, bias, variance = test.scores(z_test)
+            print(f"B = {test.count}: test MSE {np.round(MSE, 6)}, bias {np.round(bias, 6)}, "
+                  f"variance {np.round(variance, 6)}")
+
+    # Rows are weighted by how often they are drawn, instead of copied.
+    # The samples are drawn as they are fitted, so only one is stored
+    N = len(z_train)
+    if reg_method in batched_conv and regression.uses_normal_equations():
+        # Fit and predict a block of samples at a time
+        step = min(report, boot_block) if report else boot_block
+        for s in range(0, B, step):
+            betas = batched_conv[reg_method](X_train, z_train, bootstrap_samples(N, min(step, B - s)), lmb)
+            update(np.swapaxes(predict(X_test, betas)[..., 0], -1, -2),
+                   np.swapaxes(predict(X_train, betas)[..., 0], -1, -2))
+    else:
+        for i in range(B):
+            beta = reg_method(X_train, z_train, lmb, weights=bootstrap_counts(N))
+            # The column of z is the samples axis, of length 1
+            update(predict(X_test, beta), predict(X_train, beta))
+
+    data["test_MSE"], data["test_bias"], data["test_variance"] = test.scores(z_test)
+    data["train_MSE"], data["train_bias"], data["train_variance"] = train.scores(z_train)
     return data
 
 def cross_validation(X, z, k, lmb, reg_method):
     """
     Performs regression with k-fold cross-validation. 
     X and z should be pre-scaled, but not split
+    For OLS and Ridge, X.T @ X and X.T @ z are computed once, and the
+    training system of each fold is found by subtracting the fold's rows.
+    With k equal to the number of datapoints, this is leave_one_out.
 
     Args:
         X, 2darray: 
@@ -127,20 +240,40 @@ def cross_validation(X, z, k, lmb, reg_method):
             contains full data
         k, int:
             Number of CV iterations
-        lmb, float:
-            lambda-parameter for Ridge and Lasso regression
+        lmb, float or 1darray:
+            lambda-parameter for Ridge and Lasso regression.
+            Array of lambdas if reg_method is a regularization path
         reg_method, callable:
-            Function object from Regression. Is one of 3 regression methods
+            Function object from Regression. Is one of 3 regression methods,
+            or a path method fitting all lambdas at once
     Returns:
         data, dict:
             Dictionary containing train and test MSE.
     """
+    if reg_method in gram_conv and k == X.shape[0]:
+        return leave_one_out(X, z, k, lmb, reg_method)
+
     data = defaultdict(lambda: 0)
-    train_pred = np.empty(k)
-    test_pred = np.empty(k)
+    folds = kfold_split(X.shape[0], k)
 
-    kfold = KFold(n_splits = k)  # Use sklearns kfold method
-    for i, (train_inds, test_inds) in enumerate(kfold.split(X)):
+    if reg_method in gram_conv and regression.uses_normal_equations():
+        test_folds = [test_inds for _, test_inds in folds]
+        betas = gram_conv[reg_method](*regression.fold_gram(X, z, test_folds), lmb)
+        in_fold = np.zeros((k, X.shape[0]), dtype=bool)
+        for i, test_inds in enumerate(test_folds):
+            in_fold[i, test_inds] = True
+        # Squared error of every point, predicted by every fold's fit
+        sq_err = ((z - predict(X, betas)) ** 2)[..., 0]
+        test_size = np.sum(in_fold, axis=1)
+        test_err = np.sum(sq_err, axis=-1, where=in_fold)
+        train_err = np.sum(sq_err, axis=-1) - test_err
+        data["train_MSE"] = np.mean(train_err / (X.shape[0] - test_size), axis=-1)
+        data["test_MSE"] = np.mean(test_err / test_size, axis=-1)
+        return data
+
+    train_pred = np.empty((k, *np.shape(lmb)))
+    test_pred = np.empty((k, *np.shape(lmb)))
+    for i, (train_inds, test_inds) in enumerate(folds):
         x_train = X[train_inds]
         z_train = z[train_inds]
 
@@ -148,11 +281,88 @@ def cross_validation(X, z, k, lmb, reg_method):
         z_test = z[test_inds]
 
         beta = reg_method(x_train, z_train, lmb)
-        train_pred[i] = MSE(z_train, x_train @ beta)
-        test_pred[i] = MSE(z_test, x_test @ beta)
+        train_pred[i] = MSE(z_train, predict(x_train, beta))[..., 0]
+        test_pred[i] = MSE(z_test, predict(x_test, beta))[..., 0]
+
+    data["train_MSE"] = np.mean(train_pred, axis=0)
+    data["test_MSE"] = np.mean(test_pred, axis=0)
+    return data
 
-    data["train_MSE"] = np.mean(train_pred)
-    data["test_MSE"] = np.mean(test_pred)
+
+def leave_one_out(X, z, unused_iter_variable, lmb, reg_method):
+    """
+    Performs leave-one-out cross-validation for OLS and Ridge from a single fit.
+    With hat matrix H and residuals e of the fit on all data, the residual
+    of point i when left out is e_i / (1 - H_ii). The training errors of
+    each left-out fit follow from H and e in the same way.
+    Also returns the generalized cross-validation score,
+    mean(e^2) / (1 - tr(H) / N)^2.
+    X and z should be pre-scaled, but not split
+
+    Args:
+        X, 2darray:
+            contains full design matrix.
+        z, 2darray:
+            contains full data
+        unused_iter_variable, any:
+            taken for compatibility reasons. Unused
+        lmb, float or 1darray:
+            lambda-parameter for Ridge regression.
+            Array of lambdas if reg_method is a regularization path
+        reg_method, callable:
+            OLS, Ridge or Ridge_path from Regression
+    Returns:
+        data, dict:
+            Dictionary containing train and test MSE, and test GCV.
+    """
+    if reg_method not in gram_conv:
+        raise ValueError("Leave-one-out and GCV shortcuts need OLS or Ridge")
+    if reg_method == regression.Ordinary_least_squares:  # May be wrapped by profiling.timed
+        lmb = 0
+
+    N = X.shape[0]
+    z_pred, H_diag, H2_diag, H_z_res = regression.Ridge_path_hat(X, z, np.ravel(lmb))
+    res = z - z_pred
+    loo_res = res / (1 - H_diag)  # Residual of each point when left out
+
+    # Training error of the fit leaving out point i:
+    # sum_j (e_j + H_ji c_i)^2 - c_i^2, with c_i = loo_res_i
+    sq_err = np.sum(res ** 2, axis=(-2, -1), keepdims=True)
+    train_err = sq_err + 2 * loo_res * H_z_res + loo_res ** 2 * (H2_diag - 1)
+
+    data = defaultdict(lambda: 0)
+    shape = np.shape(lmb)
+    data["train_MSE"] = np.mean(train_err, axis=(-2, -1)).reshape(shape) / (N - 1)
+    data["test_MSE"] = MSE_boot(z, z + loo_res).reshape(shape)
+    data["test_GCV"] = (sq_err[:, 0, 0] / N / (1 - np.sum(H_diag, axis=(-2, -1)) / N) ** 2).reshape(shape)
+    return data
+
+
+def generalized_cross_validation(X, z, unused_iter_variable, lmb, reg_method):
+    """
+    Scores OLS and Ridge with generalized cross-validation, see leave_one_out.
+    Returns the GCV score as test MSE, so it can be used in place of
+    the other resampling methods.
+    X and z should be pre-scaled, but not split
+
+    Args:
+        X, 2darray:
+            contains full design matrix.
+        z, 2darray:
+            contains full data
+        unused_iter_variable, any:
+            taken for compatibility reasons. Unused
+        lmb, float or 1darray:
+            lambda-parameter for Ridge regression.
+            Array of lambdas if reg_method is a regularization path
+        reg_method, callable:
+            OLS, Ridge or Ridge_path from Regression
+    Returns:
+        data, dict:
+            Dictionary containing train and test MSE.
+    """
+    data = leave_one_out(X, z, unused_iter_variable, lmb, reg_method)
+    data["test_MSE"] = data.pop("test_GCV")
     return data
 
 
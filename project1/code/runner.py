@@ -0,0 +1,140 @@
+"""
+Runs the experiments in experiments.txt in one process, instead of
+one process per run. The makefile runs these through runner.py.
+Runs on the same data share its setup (loading, design matrix and split),
+see analysis.setup, and several runs are executed at once by a pool of
+threads. The fits of every run are done by one shared pool of processes.
+Run with python3 runner.py -h to see the options.
+"""
+import argparse
+import os
+import runpy
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import analysis
+import main
+import parallel
+import utils
+
+
+def read_experiments(path):
+    """
+    Reads the experiments file
+
+    Args:
+        path, str: path to experiments file
+    Returns:
+        experiments, dict: list of runs of every exercise, in the order of the file.
+            Each run is the argument list of main.py, or ["plot.py"]
+    """
+    experiments = {}
+    runs = None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                runs = experiments.setdefault(line[1:-1], [])
+            elif runs is None:
+                raise ValueError(f"{path}: run outside of an exercise: {line}")
+            elif line.split()[0] == "main.py":
+                runs.append(line.split()[1:])
+            else:
+                runs.append(line.split())
+    return experiments
+
+
+def run(cmd):
+    """
+    Performs one run, returning its wall time
+
+    Args:
+        cmd, list: argument list of main.py, or ["plot.py"]
+    """
+    t0 = time.perf_counter()
+    if cmd == ["plot.py"]:
+        with utils.lock:
+            runpy.run_path("plot.py", run_name="__main__")
+    else:
+        args = main.parse_args(cmd)
+        analysis.analyses[args.analyse]["func"](args)
+    return time.perf_counter() - t0
+
+
+def run_all(runs, jobs, threads):
+    """
+    Performs the runs, threads at a time, with jobs processes for the fits.
+    A failing run is reported, and does not stop the others.
+    Returns the runs that failed.
+    """
+    analysis.setup_memo = {}
+    failed = []
+    with parallel.shared_pool(jobs), ThreadPoolExecutor(threads) as executor:
+        futures = [(cmd, executor.submit(run, cmd)) for cmd in runs]
+        for cmd, future in futures:
+            try:
+                print(f"Done in {future.result():.1f} s: {' '.join(cmd)}")
+            except Exception:
+                traceback.print_exc()
+                print(f"Failed: {' '.join(cmd)}")
+                failed.append(cmd)
+    analysis.setup_memo = None
+    return failed
+
+
+def parse_args(args=None):
+    """
+    Uses argparse module to return an object containing
+        all runtime arguments specified in command line
+    """
+    parser = argparse.ArgumentParser(
+        description='Run the experiments of the report in one process',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    add_arg = parser.add_argument
+
+    add_arg('exercises',
+            nargs='*',
+            default=['all'],
+            help='Exercises to run, or all',
+            )
+
+    add_arg('-f', '--file',
+            type=str,
+            default='experiments.txt',
+            help='Experiments file',
+            )
+
+    add_arg('-j', '--jobs',
+            type=int,
+            default=os.cpu_count(),
+            help='Number of processes doing the fits',
+            )
+
+    add_arg('-t', '--threads',
+            type=int,
+            default=4,
+            help='Number of runs performed at once',
+            )
+
+    return parser.parse_args(args)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    experiments = read_experiments(args.file)
+    exercises = list(experiments) if args.exercises == ['all'] else args.exercises
+
+    runs = []
+    for exercise in exercises:
+        for cmd in experiments[exercise]:
+            if cmd not in runs:  # The same run in several exercises is done once
+                runs.append(cmd)
+
+    t0 = time.perf_counter()
+    failed = run_all(runs, args.jobs, args.threads)
+    print(f"{len(runs) - len(failed)} of {len(runs)} runs done in {time.perf_counter() - t0:.1f} s")
+    if failed:
+        raise SystemExit(1)
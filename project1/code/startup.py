@@ -0,0 +1,41 @@
+"""
+Reports the time spent importing each package by a Python command.
+Used by main.py --profile-startup, and can be run on any script:
+    python3 startup.py script.py [arguments]
+"""
+import sys
+import time
+import subprocess
+from collections import defaultdict
+
+
+def profile_startup(argv):
+    """
+    Reruns the command with python -X importtime, and prints the time spent
+    importing each top-level package, both at startup and later by the analysis.
+
+    Args:
+        argv, list: command line, as sys.argv, without --profile-startup
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - t0
+
+    times = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or not fields[1].strip().isdigit():
+            print(line, file=sys.stderr)  # Not import timing
+        elif not fields[2].startswith("  "):  # Imported by the program, not by another package
+            times[fields[2].strip().split(".")[0]] += int(fields[1]) / 1e6
+
+    print(f"{'package':>20} {'import [s]':>11}")
+    for name, t in sorted(times.items(), key=lambda item: -item[1])[:15]:
+        print(f"{name:>20} {t:>11.3f}")
+    print(f"{'total':>20} {sum(times.values()):>11.3f}, of {wall:.3f} s wall time")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit(f"Usage: python3 {sys.argv[0]} script.py [arguments]")
+    profile_startup(sys.argv[1:])
@@ -0,0 +1,92 @@
+"""
+Out-of-core least squares on the full SRTM terrain.
+The terrain is read in chunks of rows, and the design matrix of each chunk
+is made on the fly and folded into X.T @ X and X.T @ z. These are small,
+so memory use is bounded by the chunk size, and OLS/Ridge is solved once
+at the end for every polynomial degree and lambda.
+"""
+import time
+import numpy as np
+import regression
+import terrain as terrain_store
+import utils
+
+
+def accumulate(terrain, n, rows, stride=1, verbose=True, dtype=np.float64):
+    """
+    Accumulates the normal equations of the terrain, chunk by chunk.
+    Points are on a uniform grid over (0, 1) x (0, 1),
+    and heights are scaled by the largest height.
+
+    Args:
+        terrain, 2darray: terrain, usually memory-mapped from terrain.load
+        n, int: largest polynomial degree
+        rows, int: number of terrain rows in a chunk
+        stride, int: distance between points, for subsampling
+        verbose, bool: print the throughput of every chunk
+        dtype, np.dtype: dtype of the design matrix of a chunk.
+            The sums are accumulated in float64
+    Returns:
+        sums, dict: X.T @ X ("XTX"), X.T @ z ("XTz"), z.T @ z ("zTz"),
+            sum of z ("z_sum") and number of points ("N")
+    """
+    n_rows = len(range(0, terrain.shape[0], stride))
+    n_cols = len(range(0, terrain.shape[1], stride))
+    z_max = float(np.max(terrain))
+    x = np.linspace(0, 1, n_cols)
+    y = np.linspace(0, 1, n_rows)
+
+    l = utils.get_features(n)
+    sums = {"XTX": np.zeros((l, l)), "XTz": np.zeros((l, 1)), "zTz": 0.0, "z_sum": 0.0, "N": 0}
+    t_start = time.perf_counter()
+    for r, chunk in terrain_store.iter_rows(terrain, rows, stride):
+        t0 = time.perf_counter()
+        x_, y_ = np.meshgrid(x, y[r: r + chunk.shape[0]])
+        X = utils.create_X(x_, y_, n, dtype)
+        z = chunk.reshape(-1, 1) / z_max
+
+        XTX, XTz = regression.gram(X, z)
+        sums["XTX"] += XTX
+        sums["XTz"] += XTz
+        sums["zTz"] += float(np.sum(z ** 2))
+        sums["z_sum"] += float(np.sum(z))
+        sums["N"] += len(z)
+        if verbose:
+            dt = time.perf_counter() - t0
+            print(f"rows {r}-{r + chunk.shape[0]} of {n_rows}: {len(z) / dt:.3g} points/s")
+
+    if verbose:
+        dt = time.perf_counter() - t_start
+        print(f"{sums['N']} points in {dt:.2f} s, {sums['N'] / dt:.3g} points/s")
+    return sums
+
+
+def fit(sums, p, lmb=0):
+    """
+    Solves OLS (lmb = 0) or Ridge for polynomial degree p
+    from the accumulated normal equations of a larger degree
+
+    Args:
+        sums, dict: from accumulate
+        p, int: polynomial degree
+        lmb, float: lambda-parameter
+    Returns:
+        beta, 2darray; optimal estimators
+    """
+    l = utils.get_features(p)
+    XTX = sums["XTX"][None, :l, :l]
+    XTz = sums["XTz"][None, :l]
+    if lmb == 0:
+        return regression.Ordinary_least_squares_gram(XTX, XTz)[0]
+    return regression.Ridge_gram(XTX, XTz, lmb)[0]
+
+
+def score(sums, beta):
+    """
+    Returns the MSE and R2 of beta on all points, from the accumulated sums.
+    ||z - X beta||^2 = z.T z - 2 beta.T X.T z + beta.T X.T X beta
+    """
+    l = len(beta)
+    sse = sums["zTz"] - 2 * np.sum(beta * sums["XTz"][:l]) + np.sum(beta * (sums["XTX"][:l, :l] @ beta))
+    sst = sums["zTz"] - sums["z_sum"] ** 2 / sums["N"]
+    return sse / sums["N"], 1 - sse / sst
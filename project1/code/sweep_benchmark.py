@@ -0,0 +1,274 @@
+"""
+Benchmarks whole sweeps, as run by the analyses of main.py, to track
+whether changes make them faster or slower.
+Runs a fixed suite of configurations from experiments.txt at their fixed seeds,
+each in its own process, and records the wall time and peak memory of
+every stage and a checksum of the results. Every run is appended to a JSON history, and compared to
+a stored baseline, flagging stages slower or using more memory than the
+baseline by more than a threshold, changed results and failed cases.
+Run with python3 sweep_benchmark.py -h to see the options.
+"""
+import argparse
+import contextlib
+import datetime
+import hashlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+import analysis
+import main
+import regression
+import utils
+
+# Configurations of the suite, by name, as arguments to main.py.
+# The cache is never used, so every cell is fitted
+cases = {
+    "ols_bootstrap": "-r Bootstrap -ri 90 -p 20",
+    "bias_var_tradeoff": "-r Bootstrap -ri 90 -p 15 -a bias_var_tradeoff",
+    "ridge_cv": "-m Ridge -r CV -ri 10 -a lambda_analysis -l m6,2,51 -lc range -p 1,7",
+    "lasso_bootstrap": "-m Lasso -r Bootstrap -ri 90 -a lambda_analysis -l m6,m1,31 -lc range -p 1,11",
+    "srtm_bootstrap": "-d SRTM -r Bootstrap -ri 50 -n 50 -p 30 -log",
+}
+
+
+def checksum(results, digits=8):
+    """
+    Returns a hash of the scores of a sweep, rounded to digits significant
+    digits, so it does not change with the last bits of the floating point results
+
+    Args:
+        results, dict: (degrees, lambdas) arrays of scores, from analysis.sweep
+        digits, int: significant digits kept
+    """
+    h = hashlib.sha256()
+    for key in sorted(results):
+        h.update(key.encode())
+        h.update(" ".join(f"{v:.{digits}g}" for v in np.ravel(results[key])).encode())
+    return h.hexdigest()[:16]
+
+
+def peak_memory():
+    """ Returns the peak resident memory of the process so far, in MB """
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024**2 if sys.platform == "darwin" else maxrss / 1024  # Bytes on macOS, else kB
+
+
+def run_stage(stages, name, func, *args):
+    """
+    Calls func(*args), adding its wall time and the peak memory of the process
+    at its end to stages[name]. The best time of repeated stages is kept.
+    Returns the result of func.
+    """
+    t0 = time.perf_counter()
+    res = func(*args)
+    t = time.perf_counter() - t0
+    stage = stages.setdefault(name, {"time": np.inf, "peak_MB": 0})
+    stage["time"] = min(stage["time"], t)
+    stage["peak_MB"] = max(stage["peak_MB"], peak_memory())
+    return res
+
+
+def run_case(cmd, repeat=1):
+    """
+    Runs the setup and sweep of the analysis of main.py with arguments cmd,
+    without plotting, repeat times.
+    The peak memory includes everything run before in the process,
+    so each case is run in a new process by run_suite
+
+    Args:
+        cmd, str: arguments to main.py
+        repeat, int: number of runs, the best time of each stage is kept
+    Returns:
+        record, dict: time and peak memory of each stage, and checksum of the results
+    """
+    stages = {}
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):  # Progress lines of the sweep
+            args = main.parse_args(cmd.split() + ["-nocache"])
+            regression.set_solver(args.solver)
+            t0 = time.perf_counter()
+            x, y, z, arrays = run_stage(stages, "setup", analysis.setup, args)
+            lambdas = analysis.analyses[args.analyse]["lambdas"]
+            lmbs = args.lmb if lambdas == "all" else args.lmb[:1]
+            results = run_stage(stages, "sweep", analysis.sweep, args, arrays, lmbs)
+            total = time.perf_counter() - t0
+        stages["total"] = {"time": min(stages.get("total", {"time": np.inf})["time"], total),
+                           "peak_MB": stages["sweep"]["peak_MB"]}
+    return {"cmd": cmd, "stages": stages, "checksum": checksum(results)}
+
+
+def run_suite(names, repeat=1):
+    """
+    Runs every case in names in its own process, see run_case.
+    Cases on terrain data are skipped if the data file is missing.
+
+    Returns:
+        record, dict: date, git commit and the record of every case,
+            and the end of the error output of every failed case
+    """
+    record = {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+              "commit": git_commit(), "cases": {}, "failed": {}}
+
+    print(f"{'case':>18} {'stage':>6} {'time [s]':>9} {'peak [MB]':>10} {'checksum':>17}")
+    for name in names:
+        cmd = cases[name]
+        with contextlib.redirect_stdout(io.StringIO()):
+            data_file = utils.terrain_path(main.parse_args(cmd.split()))
+        if "SRTM" in cmd and not os.path.exists(data_file):
+            print(f"{name:>18} {'skipped, no terrain data':>44}")
+            continue
+        proc = subprocess.run([sys.executable, __file__, "-run-case", name, "-r", str(repeat)],
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if proc.returncode != 0:
+            print(f"{name:>18} {'failed':>44}")
+            print(proc.stderr, file=sys.stderr)
+            record["failed"][name] = proc.stderr.strip().splitlines()[-20:]
+            continue
+        record["cases"][name] = case = json.loads(proc.stdout)
+        for stage, values in case["stages"].items():
+            print(f"{name:>18} {stage:>6} {values['time']:>9.3f} {values['peak_MB']:>10.1f} {case['checksum']:>17}")
+    return record
+
+
+def git_commit():
+    """ Returns the current git commit, or None outside of a repository """
+    try:
+        proc = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    except OSError:
+        return None
+    return proc.stdout.strip() or None
+
+
+def compare(record, baseline, threshold, min_time=0.1):
+    """
+    Compares a run of the suite to the baseline
+
+    Args:
+        record, dict: run of the suite
+        baseline, dict: earlier run of the suite
+        threshold, float: largest relative increase of time or peak memory
+        min_time, float: smallest increase of time flagged, in seconds,
+            so short stages do not flag timing noise
+    Returns:
+        flags, list: description of every regression, changed result and failed case
+    """
+    flags = [f"{name}: failed" for name in record.get("failed", {})]
+    for name, case in record["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None or base["cmd"] != case["cmd"]:
+            continue
+        if base["checksum"] != case["checksum"]:
+            flags.append(f"{name}: results changed")
+        for stage, values in case["stages"].items():
+            for key, unit in [("time", "s"), ("peak_MB", "MB")]:
+                old, new = base["stages"][stage][key], values[key]
+                if new > old * (1 + threshold) and (key != "time" or new - old > min_time):
+                    flags.append(f"{name} {stage}: {key} {old:.3f} -> {new:.3f} {unit} (+{100 * (new / old - 1):.0f}%)")
+    return flags
+
+
+def parse_args(args=None):
+    """
+    Uses argparse module to return an object containing
+        all runtime arguments specified in command line
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the sweeps of the analyses, and compare to a baseline',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    add_arg = parser.add_argument
+
+    add_arg('-c', '--cases',
+            type=str,
+            default=",".join(cases),
+            help=f'Configurations to run, comma separated, from {list(cases)}',
+            )
+
+    add_arg('-r', '--repeat',
+            type=int,
+            default=1,
+            help='Number of runs of each configuration, the best time of each stage is kept',
+            )
+
+    add_arg('-history',
+            type=str,
+            default="./../output/benchmarks/history.json",
+            help='JSON file every run of the suite is appended to',
+            )
+
+    add_arg('-baseline',
+            type=str,
+            default="./../output/benchmarks/baseline.json",
+            help='JSON file with the run compared to. Made from the first run if missing',
+            )
+
+    add_arg('-save-baseline',
+            action='store_true',
+            help='Store this run as the baseline',
+            )
+
+    add_arg('-threshold',
+            type=float,
+            default=0.1,
+            help='Largest relative increase of time or peak memory from the baseline',
+            )
+
+    add_arg('-min-time',
+            type=float,
+            default=0.1,
+            help='Smallest increase of time from the baseline flagged, in seconds',
+            )
+
+    add_arg('-run-case',
+            type=str,
+            help=argparse.SUPPRESS,  # Used by run_suite to run one case in a new process
+            )
+
+    args = parser.parse_args(args)
+    args.cases = args.cases.split(",")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.run_case is not None:
+        print(json.dumps(run_case(cases[args.run_case], args.repeat)))
+        raise SystemExit
+
+    record = run_suite(args.cases, args.repeat)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history) as f:
+            history = json.load(f)
+    with open(args.history, "w") as f:
+        json.dump(history + [record], f, indent=1)
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(record, f, indent=1)
+        print(f"Stored as baseline in {args.baseline}")
+        for name in record["failed"]:
+            print(f"  {name}: failed")
+        if record["failed"]:
+            raise SystemExit(1)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        flags = compare(record, baseline, args.threshold, args.min_time)
+        print(f"Compared to baseline of {baseline['date']} (commit {baseline['commit']}):")
+        for name in record["cases"]:
+            if name not in baseline["cases"] or baseline["cases"][name]["cmd"] != cases[name]:
+                print(f"  {name}: not in baseline")
+        for flag in flags:
+            print("  " + flag)
+        if not flags:
+            print("  no regressions")
+        else:
+            raise SystemExit(1)
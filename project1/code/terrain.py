@@ -0,0 +1,94 @@
+"""
+Memory-mapped access to the SRTM terrain data.
+The GeoTIFF is decoded once and stored as a .npy file next to it,
+which is memory-mapped by later runs. Windows, strided subsamples and
+tiles are then read without loading the full raster.
+"""
+import os
+import numpy as np
+
+
+def store_path(path):
+    """ Returns the path of the .npy store of the terrain file path """
+    return os.path.splitext(path)[0] + ".npy"
+
+
+def load(path):
+    """
+    Returns the terrain in path as a read-only memory-mapped 2darray.
+    The first call converts the file to a .npy store,
+    which is remade if the file is newer than it.
+
+    Args:
+        path, str: path to terrain file, like a GeoTIFF
+    Returns:
+        terrain, np.memmap: (rows, columns)
+    """
+    npy = store_path(path)
+    if not os.path.exists(npy) or os.path.getmtime(npy) < os.path.getmtime(path):
+        import imageio  # Only needed to make the store
+        terrain = np.asarray(imageio.imread(path))
+        # Written to a temporary file first, so a crash
+        # never leaves a broken store behind
+        tmp = npy + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, terrain)
+        os.replace(tmp, npy)
+    return np.load(npy, mmap_mode="r")
+
+
+def window(terrain, start, size, stride=1):
+    """
+    Reads a square window of the terrain into memory
+
+    Args:
+        terrain, 2darray: terrain, usually from load
+        start, tuple: (row, column) of the upper left corner
+        size, int: number of points along each axis. If 0, the rest of the terrain
+        stride, int: distance between points, for subsampling
+    Returns:
+        window, 2darray: (size, size), or smaller at the edges of the terrain
+    """
+    r, c = start
+    if size == 0:
+        return np.array(terrain[r::stride, c::stride])
+    end = size * stride
+    return np.array(terrain[r: r + end: stride, c: c + end: stride])
+
+
+def iter_tiles(terrain, tile, stride=1):
+    """
+    Iterates over the terrain in square tiles, row by row.
+    Only one tile is read into memory at a time.
+
+    Args:
+        terrain, 2darray: terrain, usually from load
+        tile, int: number of points along each axis of a tile
+        stride, int: distance between points, for subsampling
+    Yields:
+        start, tuple: (row, column) of the upper left corner of the tile
+        window, 2darray: the tile, smaller at the edges of the terrain
+    """
+    rows, cols = terrain.shape
+    step = tile * stride
+    for r in range(0, rows, step):
+        for c in range(0, cols, step):
+            yield (r, c), window(terrain, (r, c), tile, stride)
+
+
+def iter_rows(terrain, rows, stride=1):
+    """
+    Iterates over the terrain in chunks of full rows.
+    Only one chunk is read into memory at a time.
+
+    Args:
+        terrain, 2darray: terrain, usually from load
+        rows, int: number of rows in a chunk, after subsampling
+        stride, int: distance between points, for subsampling
+    Yields:
+        row, int: index of the first row of the chunk, after subsampling
+        chunk, 2darray: (rows, columns), with fewer rows at the end of the terrain
+    """
+    step = rows * stride
+    for r in range(0, terrain.shape[0], step):
+        yield r // stride, np.array(terrain[r: r + step: stride, ::stride])
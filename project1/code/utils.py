@@ -1,22 +1,12 @@
+import threading
 import numpy as np
-import imageio
-import ast
+import franke
+import terrain as terrain_store
 
+# Held while using the global random state or matplotlib,
+# which are shared by all threads of runner.py
+lock = threading.RLock()
 
-def get_directly_implemented_funcs(module):
-    """
-    Returns the functions implemented in the given module.
-    The functions has to be directly implemented (not imported),
-    and declared using def.
-    The returned dict has the name of the functions as keys,
-    and reference to them as values.
-    """
-    s = open(f"{module.__name__}.py").read()
-    flist = {}
-    for f in ast.parse(s).body:
-        if isinstance(f, ast.FunctionDef):
-            flist[f.name] = eval("module." + f.name)
-    return flist
 
 def get_features(i):
     """ Returns the number of features of the design matrix for polynomial degree i """
@@ -56,6 +46,13 @@ def f_test(x, eps=0):
 
     return value.reshape(-1, 1)
 
+def terrain_path(args):
+    """ Returns the path to the SRTM data file """
+    if args.data_file is None:
+        return "./../DataFiles/SRTM_data_Norway_1.tif"
+    return args.data_file
+
+
 def load_data(args):
     """
     Creates / loads specified dataset.
@@ -73,8 +70,9 @@ def load_data(args):
     if args.dataset == "Franke":
         x = np.sort(np.random.uniform(size=N))
         y = np.sort(np.random.uniform(size=N))
+        # The noise is drawn from its own streams seeded by args.seed, see franke.py
+        z = franke.generate(x, y, args.epsilon, args.seed, args.jobs).reshape(-1, 1)
         x, y = np.meshgrid(x, y)
-        z = FrankeFunction(x, y, eps=args.epsilon)
 
     elif args.dataset == "Test":
         x = np.sort(np.random.uniform(-3, 3, size=N))
@@ -82,20 +80,16 @@ def load_data(args):
         z = f_test(x, args.epsilon)
 
     elif args.dataset == "SRTM":
-        if args.data_file is None:
-            path = "./../DataFiles/SRTM_data_Norway_1.tif"
-        else:
-            path = args.data_file
+        path = terrain_path(args)
 
         # numbers stolen from other group, can be changed
         xstart = 50
         ystart = 50
 
-        terrain = imageio.imread(path)
-        # to not deal with too large image, only NxN
-        if N != 0:
-            # Plot entire terrain map by setting N=0
-            terrain = terrain[xstart: xstart + N, ystart: ystart + N]
+        # to not deal with too large image, only NxN, every stride'th point
+        # Plot entire terrain map by setting N=0
+        start = (xstart, ystart) if N != 0 else (0, 0)
+        terrain = terrain_store.window(terrain_store.load(path), start, N, args.stride)
         nx, ny = terrain.shape
         x = np.sort(np.random.uniform(size=nx))
         y = np.sort(np.random.uniform(size=ny))
@@ -106,15 +100,22 @@ def load_data(args):
     return x, y, z
 
 
-def create_X(x, y, n):
+def create_X(x, y, n, dtype=np.float64):
     """
     Sets up design matrix
 
+    Every power of x and y is computed once, and the columns
+    are formed as products of these cached powers, written into
+    a preallocated Fortran-ordered (column-major) array.
+    The column ordering is 1, x, y, x^2, xy, y^2, ...
+
     Parameters:
         x, y: array-like
             Are flattened if not already
         n: int
             max polynomial degree
+        dtype: np.dtype
+            dtype of the design matrix. The powers are computed in float64
     Returns:
         X: 2darray
             Design matrix. Includes intercept.
@@ -124,17 +125,25 @@ def create_X(x, y, n):
         for i in range(n+1):
             X[:, i] = x**i
         return X
-    if not 1 in x.shape:
-        x = np.ravel(x)
-        y = np.ravel(y)
+    x = np.ravel(x)
+    y = np.ravel(y)
 
     N = len(x)
     l = get_features(n)  # Number of elements in beta
-    X = np.ones((N, l))
+    X = np.empty((N, l), dtype=dtype, order="F")
+
+    # Column i holds x**i and y**i respectively
+    x_pow = np.empty((N, n + 1), order="F")
+    y_pow = np.empty((N, n + 1), order="F")
+    x_pow[:, 0] = 1
+    y_pow[:, 0] = 1
+    for i in range(1, n + 1):
+        np.multiply(x_pow[:, i - 1], x, out=x_pow[:, i])
+        np.multiply(y_pow[:, i - 1], y, out=y_pow[:, i])
 
+    X[:, 0] = 1
     for i in range(1, n + 1):
         q = i * (i + 1) // 2
-        for k in range(i + 1):
-            X[:, q + k] = (x ** (i - k)) * (y ** k)
+        # x^i y^0, x^(i-1) y^1, ..., x^0 y^i
+        np.multiply(x_pow[:, i::-1], y_pow[:, :i + 1], out=X[:, q:q + i + 1])
     return X
-
@@ -2,10 +2,10 @@
 Contains code for neural network, as well as optimizer (momentum sgd)
 """
 from collections import defaultdict
-import autograd.numpy as np
+import numpy as np
 from tqdm import tqdm
-from autograd import elementwise_grad
-from cost_activation import Costs, Activations
+from cost_activation import Costs, Activations, with_out
+from sampler import Sampler
 import utils
 import warnings
 
@@ -17,14 +17,17 @@ class Optimizer:
     """
     Learning optimizer for neural network.
     Set gamma to give more or less momentum
+    The velocities are updated in place, and the one returned
+    is overwritten by the next call for the same layer
     """
-    def __init__(self, gamma=0, layer_sizes=None):
+    def __init__(self, gamma=0, shapes=None):
         self.g = min(1, max(gamma, 0))  # ensure between 0 and 1
-        self.prev_v = [np.zeros(i) for i in layer_sizes]
+        self.prev_v = [np.zeros(shape) for shape in shapes]
 
     def __call__(self, eta_grad, layer=0):
-        v = self.g * self.prev_v[layer] + eta_grad
-        self.prev_v[layer] = v
+        v = self.prev_v[layer]
+        v *= self.g
+        v += eta_grad
         return v
 
 
@@ -35,7 +38,11 @@ class FFNN(Costs, Activations):
     from cost_activations.py:
     Costs, Activations
      - contains different cost and activation functions
-       used for backpropagation
+       used for backpropagation, and their derivatives
+
+    activation, output_activation and cost are names of these, or functions
+    written with autograd.numpy, which are differentiated by autograd.
+    A cost function is called with the output layer and the targets.
     """
     def __init__(self,
                  design,
@@ -51,6 +58,7 @@ class FFNN(Costs, Activations):
                  activation="sigmoid",
                  cost="MSE",
                  output_activation="none",
+                 sampling="shuffle",
                  ):
 
         self.X = design             # Training data
@@ -60,7 +68,8 @@ class FFNN(Costs, Activations):
 
         if self.args.dataset == "Franke" and self.args.history:
             # Used for rescaling Franke data when calculating MSE in training history
-            self.z_Franke = utils.load_data(args)[-1]
+            z_Franke = utils.load_data(args)[-1]
+            self.z_mean, self.z_std = np.mean(z_Franke), np.std(z_Franke)
 
 
         # Set mini batch size
@@ -68,6 +77,8 @@ class FFNN(Costs, Activations):
             self.batch_size = self.N
         else:
             self.batch_size = batch_size
+        # Minibatches of every epoch, see sampler.py
+        self.sampler = Sampler([self.X, self.static_target], self.batch_size, sampling)
 
         self.eta0 = learning_rate
         self.de = dynamic_eta
@@ -77,16 +88,14 @@ class FFNN(Costs, Activations):
         # Number of nodes in all layers
         self.nodes = np.array([self.X.shape[1], *hidden_nodes, self.static_target.shape[1]])
 
-        # All layers of neural network (1 input, n hidden, 1 output)
-        # Number of rows in each layer corresponds to the number of data points
-        self.Layers = [np.zeros((self.N, n)) for n in self.nodes]
-        self.Layers[0] = self.X.copy()
-
-        self.z = self.Layers.copy()         # Activation layer input
-        self.delta_l = self.Layers.copy()   # Activation layer input gradient
+        # Buffers of the layers for every number of rows fed forward, see plan
+        self.lead = ()  # Leading axes of the weights, before the layer axes
+        self.buffers = {}
+        self.grads = None
+        self.infer_buffers = {}  # Buffers of infer, by number of rows
 
         # Initial zero for weights ensures that weights[n] corresponds to Layers[n]
-        if wi and activation not in ("none", "linear"):
+        if wi and activation in ("sigmoid", "tanh", "relu", "leaky_relu"):
             if activation == "sigmoid":  # Xavier initialization
                 self.weights = [0] + [np.random.uniform(-1/np.sqrt(n), 1/np.sqrt(n), size=(n, m)) for n, m in zip(self.nodes[:-1], self.nodes[1:])]
             elif activation == "tanh":  # Normalized Xaviet initialization
@@ -100,8 +109,9 @@ class FFNN(Costs, Activations):
         self.bias = [np.ones((1, n)) * bias0 for n in self.nodes]
         
         # Calculate gradients with momentum (gamma=0 by default)
-        self.optim_w = Optimizer(gamma, self.nodes)
-        self.optim_b = Optimizer(gamma, self.nodes)
+        self.gamma = gamma
+        self.optim_w = Optimizer(gamma, [np.shape(w) for w in self.weights])
+        self.optim_b = Optimizer(gamma, [np.shape(b) for b in self.bias])
 
         # Activation functions available
         activation_funcs = {'sigmoid': self.sigmoid,
@@ -118,13 +128,46 @@ class FFNN(Costs, Activations):
                       'cross_entropy': self.cross_entropy}
 
         # Callable activation and cost function and their derivatives
-        self.activation = activation_funcs[activation]
-        self.activation_out = activation_funcs[output_activation]
-        self.cost = cost_funcs[cost]
+        self.activation = activation_funcs.get(activation, activation)
+        self.activation_out = activation_funcs.get(output_activation, output_activation)
+        if callable(cost):
+            user_cost = cost
+            cost = lambda t_: user_cost(t_, self.t)
+            cost.__name__ = user_cost.__name__
+        self.cost = cost_funcs.get(cost, cost)
+
+        self.activation_der = self.activation_derivative(self.activation)
+        self.out_der = self.activation_derivative(self.activation_out)
+        self.cost_der = self.cost_derivative(self.cost)
+
+        # Functions supplied by the user do not write into buffers themselves
+        if not isinstance(activation, str):
+            self.activation = with_out(self.activation)
+        if not isinstance(output_activation, str):
+            self.activation_out = with_out(self.activation_out)
+
+    def plan(self, x):
+        """
+        Feeds x to the input layer, and selects the buffers of the layers
+        for len(x) rows. These are allocated the first time len(x) is fed,
+        so after the first epoch, training allocates no new arrays.
+         - z: activation layer input
+         - Layers: activation layer output
+         - delta_l: activation layer input gradient
+         - der: derivative of the activation
+        The gradients of the weights and biases are allocated once.
+        """
+        rows = len(x)
+        if rows not in self.buffers:
+            self.buffers[rows] = [[x] + [np.zeros((*self.lead, rows, n)) for n in self.nodes[1:]]
+                                  for _ in range(4)]
+        self.z, self.Layers, self.delta_l, self.der = self.buffers[rows]
+        self.Layers[0] = x
 
-        self.activation_der = elementwise_grad(self.activation)
-        self.out_der = elementwise_grad(self.activation_out)
-        self.cost_der = elementwise_grad(self.cost)
+        if self.grads is None:
+            # Weight and bias gradients, and the lambda term added to them
+            self.grads = [[np.zeros_like(p) for p in params] for params in (self.weights, self.bias) for _ in range(2)]
+        self.w_grad, self.w_l2, self.b_grad, self.b_l2 = self.grads
 
 
     def backpropagation(self):
@@ -137,47 +180,62 @@ class FFNN(Costs, Activations):
         # Calculate gradient of output layer
         if self.activation_out.__name__ == 'softmax' and self.cost.__name__ == 'cross_entropy':
             # Analytical derivative for softmax and cross entropy
-            self.delta_l[-1] = self.Layers[-1] - self.t
+            np.subtract(self.Layers[-1], self.t, out=self.delta_l[-1])
 
-        elif self.activation_out.__name__ == 'none':
-            self.delta_l[-1] = self.cost_der(self.Layers[-1])
+        elif self.activation_out.__name__ == 'linear':
+            self.cost_der(self.Layers[-1], out=self.delta_l[-1])
 
         else:
-            self.delta_l[-1] = self.cost_der(self.Layers[-1]) * self.out_der(self.z[-1])
+            self.cost_der(self.Layers[-1], out=self.delta_l[-1])
+            self.delta_l[-1] *= self.out_der(self.z[-1], self.Layers[-1], out=self.der[-1])
 
         # Calculate gradients of the hidden layers
         for i in reversed(range(1, len(self.nodes) - 1)):
-            self.delta_l[i] = self.delta_l[i + 1] @ self.weights[i + 1].T \
-                                * self.activation_der(self.z[i])
+            np.matmul(self.delta_l[i + 1], np.swapaxes(self.weights[i + 1], -1, -2), out=self.delta_l[i])
+            self.delta_l[i] *= self.activation_der(self.z[i], self.Layers[i], out=self.der[i])
 
         # Update weights and biases for each previous layer
+        l2 = np.any(self.lmb)
         for n in reversed(range(1, len(self.nodes))):
             # find weight and bias gradient with l2-norm
-            weight_gradient = self.Layers[n - 1].T @ self.delta_l[n] + self.lmb * self.weights[n]
-            bias_grad = np.sum(self.delta_l[n], axis=0) + self.lmb * self.bias[n]
+            weight_gradient = np.matmul(np.swapaxes(self.Layers[n - 1], -1, -2), self.delta_l[n], out=self.w_grad[n])
+            bias_grad = np.sum(self.delta_l[n], axis=-2, keepdims=True, out=self.b_grad[n])
+            if l2:
+                weight_gradient += np.multiply(self.lmb, self.weights[n], out=self.w_l2[n])
+                bias_grad += np.multiply(self.lmb, self.bias[n], out=self.b_l2[n])
             # calculate the weight and bias update
-            weight_change = self.optim_w(self.eta * weight_gradient, n)
-            bias_change = self.optim_b(self.eta * bias_grad, n)
+            weight_gradient *= self.eta
+            bias_grad *= self.eta
+            weight_change = self.optim_w(weight_gradient, n)
+            bias_change = self.optim_b(bias_grad, n)
             # update weight and bias
             self.weights[n] -= weight_change
             self.bias[n] -= bias_change
 
-        # If weight and bias to output layer doesnt change, end training
-        if max(np.max(abs(weight_change)), np.max(abs(bias_change))) < 1e-8:
+        self.check_converged(1)
+
+    def check_converged(self, n):
+        """
+        If weight and bias to layer n (the first hidden) doesnt change, end training.
+        The gradient buffers of layer n are reused for the absolute changes
+        """
+        weight_change = np.abs(self.optim_w.prev_v[n], out=self.w_grad[n])
+        bias_change = np.abs(self.optim_b.prev_v[n], out=self.b_grad[n])
+        if max(np.max(weight_change), np.max(bias_change)) < 1e-8:
             self.converged = True
 
     def feed_forward(self):
-        # Update the hidden layers
+        # Update the hidden layers, and the final layer with its own activation
         for n in range(1, len(self.nodes)):
-            self.z[n] = self.Layers[n - 1] @ self.weights[n] + self.bias[n]
-            self.Layers[n] = self.activation(self.z[n])
-
-        self.Layers[-1] = self.activation_out(self.z[n]) # Update final layer
+            np.matmul(self.Layers[n - 1], self.weights[n], out=self.z[n])
+            self.z[n] += self.bias[n]
+            activation = self.activation if n < len(self.nodes) - 1 else self.activation_out
+            activation(self.z[n], out=self.Layers[n])
 
-    def train(self, epochs, train_history=False, test=None):
+    def train(self, epochs, train_history=False, test=None, history_every=1, history_points=None):
         """
         Training the neural network by looping over epochs:
-         1) Initializing shuffled minibatches
+         1) Drawing minibatches with self.sampler
          2) Update each layers with their weights and biases
          3) Updates weights and biases with backpropagation
 
@@ -188,10 +246,16 @@ class FFNN(Costs, Activations):
                 if true, calculate mse/accuracy during training, on train data
             test: 2tuple with X_test and z_test
                 is not None, also calculate mse/accuracy during training on test data
+            history_every: int
+                calculate the history every history_every epochs. The rest are nan
+            history_points: int
+                if given, calculate the history on this many random points
+                of the train and test data, the same every epoch
         """
-        self.history = defaultdict(lambda: np.zeros(epochs) * np.nan)
+        self.history = defaultdict(lambda: np.zeros((*self.lead, epochs)) * np.nan)
         self.converged = False
-        indicies = np.arange(self.N)
+        if train_history:
+            self.history_data(test, history_points)
         pbar = tqdm(range(epochs), desc=f"eta: {self.eta0}, lambda: {self.lmb}. Training")
 
         for epoch in pbar:
@@ -200,17 +264,12 @@ class FFNN(Costs, Activations):
             self.eta = self.eta0 * (1 - epoch / epochs) if self.de else self.eta0
 
             # save training performance
-            if train_history:
-                self.train_history(epoch, test)
-
-            np.random.shuffle(indicies)  # Shuffle indices
-            self.X_s = self.X[indicies]  # Shuffled input
-            self.shuffle_t = self.static_target[indicies]  # Shuffled target
+            if train_history and epoch % history_every == 0:
+                self.train_history(epoch)
 
-            for i in range(0, self.N, self.batch_size):
+            for x, self.t in self.sampler.epoch():
                 # Loop over minibatches
-                self.Layers[0] = self.X_s[i: i + self.batch_size]
-                self.t = self.shuffle_t[i: i + self.batch_size]
+                self.plan(x)
 
                 try:
                     self.feed_forward()
@@ -227,27 +286,61 @@ class FFNN(Costs, Activations):
                 print("RuntimeWarning. Overflow or underflow encoutered")
                 break
 
-    def train_history(self, i, test):
+    def history_data(self, test, points=None):
         """
-        Calculate mse/accuracy/loss/r2 during training. 
-        Network never learns from this
-        Slows down code a lot
+        Sets the train and test data the training history is calculated on.
+        If points is given, a random subset of this many points of each,
+        drawn from a generator of its own, so training draws the same minibatches.
+        Franke targets are rescaled once, here.
         """
+        rng = np.random.default_rng(self.args.seed)
+        self.history_sets = []
         for name, (x, t) in zip(("train", "test"), ((self.X, self.static_target), test)):
+            if points and points < len(x):
+                rows = np.sort(rng.choice(len(x), points, replace=False))
+                x, t = x[rows], t[rows]
+            if self.nodes[-1] == 1:
+                t = t * self.z_std + self.z_mean
+            self.history_sets.append((name, x, t))
+
+            if test is None:
+                break
+
+    def train_history(self, i):
+        """
+        Calculate mse/accuracy/loss/r2 during training, on the data set by history_data.
+        Network never learns from this, and its layers used in training are kept
+        """
+        for name, x, t in self.history_sets:
+            out = self.infer(x)
             if self.nodes[-1] > 1:
-                self.history[name + "_accuracy"][i] = self.predict_accuracy(x, t)
-                loss = self.predict(x) - t
-                self.history[name + "_loss"][i] = max(np.mean(loss, axis=0))
+                self.history[name + "_accuracy"][..., i] = self.accuracy(out, t)
+                loss = out - t
+                self.history[name + "_loss"][..., i] = np.max(np.mean(loss, axis=-2), axis=-1)
 
             else:
-                # Franke function MSE 
-                pred = utils.rescale_data(self.predict(x), self.z_Franke)
-                target = utils.rescale_data(t, self.z_Franke)
-                self.history[name + "_mse"][i] = utils.MSE(target, pred)[0]
-                self.history[name + "_R2"][i] = utils.R2(target, pred)[0]
+                # Franke function MSE, rescaled
+                pred = out * self.z_std + self.z_mean
+                sq_err = np.sum((t - pred) ** 2, axis=(-2, -1))
+                self.history[name + "_mse"][..., i] = sq_err / len(t)
+                self.history[name + "_R2"][..., i] = 1 - sq_err / np.sum((t - np.mean(t)) ** 2)
 
-            if test is None:
-                break
+    def infer(self, x):
+        """
+        Calculate output layer for x, in buffers of its own, so the layers
+        used in training are kept. The output is overwritten by the next call
+        """
+        rows = len(x)
+        if rows not in self.infer_buffers:
+            self.infer_buffers[rows] = [(np.zeros((*self.lead, rows, n)), np.zeros((*self.lead, rows, n)))
+                                        for n in self.nodes[1:]]
+        a = x
+        for n, (z, a_n) in enumerate(self.infer_buffers[rows], start=1):
+            np.matmul(a, self.weights[n], out=z)
+            z += self.bias[n]
+            activation = self.activation if n < len(self.nodes) - 1 else self.activation_out
+            a = activation(z, out=a_n)
+        return a
 
     def predict(self, x):
         """
@@ -256,16 +349,18 @@ class FFNN(Costs, Activations):
         """
         if self.converged is None:
             return np.nan
-
-        self.Layers[0] = x
-        self.feed_forward()
-        return self.Layers[-1]
+        return self.infer(x).copy()
 
     def predict_accuracy(self, x, y):
         """
         Convert probabilities to accuracy score
         """
-        probs = self.predict(x)
+        return self.accuracy(self.predict(x), y)
+
+    def accuracy(self, probs, y):
+        """
+        Accuracy score of the probabilities probs of the output layer
+        """
         msg = "\n\nThe probabilities do not sum to 1!\nWorry not, this probably just means there is a nan in there. Check for RuntimeWarnings in autograd.\nRerun, but with lower gamma or eta or something else\n"
         try:
             if not (abs(np.sum(probs, axis=1) - 1) < 1e-10).all():  # make sure probabilities sum to 1
@@ -299,6 +394,122 @@ class FFNN(Costs, Activations):
         self.bias = data["biases"]
 
 
+class FFNNGrid(FFNN):
+    """
+    G networks with the same layers, initial weights and minibatches,
+    but their own learning rate and lambda, trained at once.
+    The weights and biases of all are stacked along a leading axis, so
+    feed forward and backpropagation are batched matrix products,
+    and a whole grid of (eta, lambda) is trained in about the time of a few networks.
+    Since all networks are drawn from the same random state, each ends as
+    the FFNN with its learning rate and lambda would, from the same seed.
+
+    An FFNN stops training at the first overflow. As overflow of one network
+    can not be told apart from that of another, a network is instead stopped
+    when its weights are no longer finite, and then predicts nan.
+    A network which converges is stopped, while the rest train on.
+    """
+    def __init__(self, design, target, args, learning_rate=(0.1,), lmb=(0,), **kwargs):
+        """
+        Args:
+            learning_rate, array-like: learning rate of each network
+            lmb, array-like: lambda of each network, or one for all
+            the rest as FFNN
+        """
+        super().__init__(design, target, args, learning_rate=0, lmb=0, **kwargs)
+        self.G = len(learning_rate)
+        self.eta0 = np.reshape(learning_rate, (-1, 1, 1)).astype(float)
+        self.lmb = np.broadcast_to(np.reshape(lmb, (-1, 1, 1)), (self.G, 1, 1)).astype(float)
+
+        self.weights = [0] + [np.repeat(w[None], self.G, axis=0) for w in self.weights[1:]]
+        self.bias = [np.repeat(b[None], self.G, axis=0) for b in self.bias]
+        self.optim_w = Optimizer(self.gamma, [np.shape(w) for w in self.weights])
+        self.optim_b = Optimizer(self.gamma, [np.shape(b) for b in self.bias])
+        self.lead = (self.G,)
+
+        self.active = np.ones((self.G, 1, 1))            # 0 for networks which stopped training
+        self.stopped = np.zeros(self.G, dtype=bool)      # Converged during the last epoch
+        self.diverged = np.zeros(self.G, dtype=bool)
+
+    def check_converged(self, n):
+        weight_change = np.abs(self.optim_w.prev_v[n], out=self.w_grad[n])
+        bias_change = np.abs(self.optim_b.prev_v[n], out=self.b_grad[n])
+        change = np.maximum(np.max(weight_change, axis=(-2, -1)), np.max(bias_change, axis=(-2, -1)))
+        self.stopped |= change < 1e-8
+
+    def stop(self, networks):
+        """ Stops training networks, a boolean array, also removing their momentum """
+        self.active[networks] = 0
+        for optim in (self.optim_w, self.optim_b):
+            for v in optim.prev_v:
+                if np.ndim(v) == 3:
+                    v[networks] = 0
+
+    def train(self, epochs, train_history=False, test=None, history_every=1, history_points=None):
+        """
+        Trains all networks, see FFNN.train
+        """
+        self.history = defaultdict(lambda: np.zeros((self.G, epochs)) * np.nan)
+        self.converged = False
+        if train_history:
+            self.history_data(test, history_points)
+        pbar = tqdm(range(epochs), desc=f"{self.G} networks. Training")
+
+        with np.errstate(all="ignore"):  # Diverging networks are found from their weights
+            for epoch in pbar:
+
+                # Learning schedule
+                self.eta = self.eta0 * (1 - epoch / epochs) if self.de else self.eta0
+                self.eta = self.eta * self.active
+
+                # save training performance
+                if train_history and epoch % history_every == 0:
+                    self.train_history(epoch)
+
+                self.stopped[:] = False
+                for x, self.t in self.sampler.epoch():
+                    # Loop over minibatches
+                    self.plan(x)
+                    self.feed_forward()
+                    self.backpropagation()
+
+                finite = np.ones(self.G, dtype=bool)
+                for w, b in zip(self.weights[1:], self.bias[1:]):
+                    finite &= np.isfinite(w).all(axis=(-2, -1)) & np.isfinite(b).all(axis=(-2, -1))
+                running = self.active[:, 0, 0] > 0
+                self.diverged |= running & ~finite
+                self.stop(running & (self.stopped | ~finite))
+
+                pbar.set_description(f"{int(np.sum(self.active))} of {self.G} networks. Training")
+                if not self.active.any():
+                    self.converged = True
+                    print(f"All networks stopped after {epoch} epochs")
+                    break
+
+        if self.diverged.any():
+            print(f"{np.sum(self.diverged)} networks diverged")
+
+    def infer(self, x):
+        """
+        Calculate output layer of every network, (G, len(x), outputs), see FFNN.infer.
+        Diverged networks predict nan
+        """
+        with np.errstate(all="ignore"):
+            out = super().infer(x)
+        out[self.diverged] = np.nan
+        return out
+
+    def accuracy(self, probs, y):
+        """
+        Accuracy score of every network.
+        nan for networks whose probabilities do not sum to 1
+        """
+        valid = (abs(np.sum(probs, axis=-1) - 1) < 1e-10).all(axis=-1)
+        pred = np.argmax(probs, axis=-1)
+        true = np.argmax(y, axis=1)
+        return np.where(valid, np.mean(pred == true, axis=-1), np.nan)
+
+
 if __name__ == "__main__":
     from utils import *
     from sklearn.model_selection import train_test_split
@@ -4,6 +4,7 @@ Here we do stochastic gradient descent for regression and logistic regression
 import numpy as np
 import utils 
 from tqdm import tqdm
+from sampler import Sampler
 
 
 def SGD(X, z, args, beta, eta0, batch_size, lmb=0, gamma=0):
@@ -33,26 +34,18 @@ def SGD(X, z, args, beta, eta0, batch_size, lmb=0, gamma=0):
     X_train, X_test = X
     z_train, z_test = z
 
-    inds = np.arange(0, n)
+    # Minibatches of every epoch
+    sampler = Sampler([X_train, z_train], M, args.sampling)
 
     MSE_train = np.zeros(args.num_epochs)
     MSE_test  = np.zeros(args.num_epochs)
 
     for epoch_i in range(args.num_epochs):
-        # Initialize randomized training data for epoch
-        np.random.shuffle(inds)
-        X_train_shuffle = X_train[inds]
-        z_train_shuffle = z_train[inds]
-
         eta = eta0 * (1 - epoch_i / args.num_epochs) if args.dynamic_eta else eta0
 
-        for i in range(0, n, M):
+        for xi, zi in sampler.epoch():
             # Loop over mini batches
 
-            xi = X_train_shuffle[i:i+M]
-            zi = z_train_shuffle[i:i+M]
-
-
             gradient = 2 * xi.T @ ((xi @ beta)-zi.T[0]) / M \
                         + 2 * lmb * beta
 
@@ -94,10 +87,10 @@ def SGDL(X, z, W, args, eta, batch_size, lmb=0, gamma=0):
     #initialize
     X_train, X_test = X
     z_train, z_test = z
-    n_points = np.shape(X_train)[0]
     v = 0
 
-    inds = np.arange(0, n_points)
+    # Minibatches of every epoch
+    sampler = Sampler([X_train, z_train], batch_size, args.sampling)
 
     #Setup accuracy's
     accuracy_train = np.zeros(args.num_epochs)
@@ -106,16 +99,8 @@ def SGDL(X, z, W, args, eta, batch_size, lmb=0, gamma=0):
     eta_0 = eta  # To be used for learning schedule
     pbar = tqdm(range(args.num_epochs), desc=f"eta: {eta:.6f}, lambda: {lmb:.6f}. Training")
     for epoch_i in pbar:
-        # Initialize randomized training data for epoch
-        np.random.shuffle(inds)
-        X_train_shuffle = X_train[inds]
-        z_train_shuffle = z_train[inds]
-
-        for i in range(0, n_points, batch_size):
+        for xi, zi in sampler.epoch():
             # Loop over mini batches
-
-            xi = X_train_shuffle[i:i+batch_size]
-            zi = z_train_shuffle[i:i+batch_size]
             gradient = xi.T@(output_activation(xi@W) - zi) + 2*lmb*W
             v = v * gamma + eta * gradient
             W = W - v
@@ -1,35 +1,47 @@
 from collections import defaultdict
 import numpy as np
-from sklearn.preprocessing import StandardScaler, MinMaxScaler, Normalizer
-from sklearn.linear_model import LogisticRegression
 
 # Our files
-from NeuralNetwork import FFNN
 import SGD
-import plot
 import utils
+# plot (matplotlib, seaborn, pandas), FFNN (tqdm), the scalers and LogisticRegression
+# are slow to import, so they are imported by the analyses using them
 
 
-class NoneScaler(StandardScaler):
+def get_scaler(name, **kwargs):
     """
-    To have option of no scaling
+    Returns a new scaler of scikit-learn, imported here as it is slow to import
+
+    Args:
+        name, str: None, S (Standard), N (Normalizer) or M (MinMax)
+        kwargs: passed to the scaler
     """
+    from sklearn.preprocessing import StandardScaler, MinMaxScaler, Normalizer
 
-    def transform(self, x):
-        return x
+    class NoneScaler(StandardScaler):
+        """
+        To have option of no scaling
+        """
 
+        def transform(self, x):
+            return x
 
-scale_conv = {"None": NoneScaler(),
-                "S": StandardScaler(),
-                "N": Normalizer(),
-                "M": MinMaxScaler()}
+    scale_conv = {"None": NoneScaler,
+                  "S": StandardScaler,
+                  "N": Normalizer,
+                  "M": MinMaxScaler}
+    return scale_conv[name](**kwargs)
 
 
 def NN_regression(args):
+    from NeuralNetwork import FFNN
+    import plot
+    if args.grid:
+        return NN_regression_grid(args)
     p = args.polynomial
     etas = args.eta
     lmbs = args.lmb
-    scaler = scale_conv[args.scaling]
+    scaler = get_scaler(args.scaling)
     if args.pred:
         # Reduce noise for surface plot comparison
         args.epsilon = 0.05
@@ -57,9 +69,11 @@ def NN_regression(args):
                       activation=args.act_func,
                       cost="MSE",
                       output_activation="none",
+                      sampling=args.sampling,
                       )
 
-            NN.train(args.num_epochs, train_history=args.history, test=(X_test, z_test))
+            NN.train(args.num_epochs, train_history=args.history, test=(X_test, z_test),
+                     history_every=args.history_every, history_points=args.history_points)
 
             # Rescale data to obtain correct values
             train_pred = utils.rescale_data(NN.predict(X_train), z)
@@ -112,6 +126,7 @@ def NN_regression(args):
 
 def linear_regression(args):
     """ SGD """
+    import plot
     print("Doing linear regression")
     p = args.polynomial
     etas = args.eta
@@ -124,9 +139,9 @@ def linear_regression(args):
     if args.scaling == "S":
         # Don't divide data by std for Franke 
         # Since std<1, causing too much increase of data values  
-        scaler = StandardScaler(with_std=False)
+        scaler = get_scaler("S", with_std=False)
     else:
-        scaler = scale_conv[args.scaling]
+        scaler = get_scaler(args.scaling)
 
     x, y, z = utils.load_data(args)
     X = utils.create_X(x, y, p, intercept=False if p == 1 else True)
@@ -212,6 +227,8 @@ def linear_regression(args):
 
 
 def logistic_regression(args):
+    from sklearn.linear_model import LogisticRegression
+    import plot
     etas = args.eta
     lmbs = args.lmb
     batch_size = args.batch_size
@@ -223,7 +240,7 @@ def logistic_regression(args):
     n_features = np.shape(X)[1]
 
     #split and scale data
-    scaler = scale_conv[args.scaling]
+    scaler = get_scaler(args.scaling)
     X_train, X_test, z_train, z_test = utils.split_scale(X, z, args.tts, scaler)
     #for easier updates of weights
     n_test_patients = np.shape(X_test)[0]
@@ -266,6 +283,10 @@ def logistic_regression(args):
 
 
 def NN_classification(args):
+    from NeuralNetwork import FFNN
+    import plot
+    if args.grid and not (args.history and len(args.eta) == 1):  # The history of one network is plotted alone
+        return NN_classification_grid(args)
     etas = args.eta
     lmbs = args.lmb
 
@@ -274,7 +295,7 @@ def NN_classification(args):
     X = dataset.data
     
     z = utils.categorical(z_)
-    scaler = scale_conv[args.scaling]
+    scaler = get_scaler(args.scaling)
     X_train, X_test, z_train, z_test = utils.split_scale(X, z, args.tts, scaler)
     print(X_test.shape)
     data = defaultdict(lambda: np.zeros((len(etas), len(lmbs))))
@@ -297,8 +318,10 @@ def NN_classification(args):
                       activation=args.act_func,
                       cost="cross_entropy",
                       output_activation="softmax",
+                      sampling=args.sampling,
                       )
-            NN.train(args.num_epochs, train_history=args.history, test=(X_test, z_test))
+            NN.train(args.num_epochs, train_history=args.history, test=(X_test, z_test),
+                     history_every=args.history_every, history_points=args.history_points)
             data["train accuracy"][i][j] = NN.predict_accuracy(X_train, z_train)
             data["test accuracy"][i][j] = NN.predict_accuracy(X_test, z_test)
 
@@ -319,3 +342,109 @@ def NN_classification(args):
         plot.eta_epochs(train_data, args, vmax=1, vmin=0)
     else:
         plot.eta_lambda(data, args, NN=True)
+
+
+def train_grid(X_train, z_train, args, cost, output_activation, test):
+    """
+    Trains a network for every (eta, lambda) in args at once, see FFNNGrid.
+    Network i * len(args.lmb) + j has eta i and lambda j.
+    """
+    from NeuralNetwork import FFNNGrid
+    np.random.seed(args.seed)
+    etas, lmbs = np.meshgrid(args.eta, args.lmb, indexing="ij")
+    NN = FFNNGrid(X_train,
+                  z_train,
+                  args,
+                  hidden_nodes=args.hidden_nodes,
+                  batch_size=args.batch_size,
+                  learning_rate=etas.ravel(),
+                  dynamic_eta=args.dynamic_eta,
+                  lmb=lmbs.ravel(),
+                  gamma=args.gamma,
+                  wi=args.weight_initialization,
+                  activation=args.act_func,
+                  cost=cost,
+                  output_activation=output_activation,
+                  sampling=args.sampling,
+                  )
+    NN.train(args.num_epochs, train_history=args.history, test=test,
+             history_every=args.history_every, history_points=args.history_points)
+    return NN
+
+
+def NN_regression_grid(args):
+    """
+    NN_regression, training all networks at once with -grid
+    """
+    import plot
+    p = args.polynomial
+    etas = args.eta
+    lmbs = args.lmb
+    shape = (len(etas), len(lmbs))
+    scaler = get_scaler(args.scaling)
+    if args.pred:
+        # Reduce noise for surface plot comparison
+        args.epsilon = 0.05
+    x, y, z = utils.load_data(args)
+    X = utils.create_X(x, y, p, intercept=False if p == 1 else True)
+    X_train, X_test, z_train, z_test = utils.split_scale(X, z, args.tts, scaler)
+
+    NN = train_grid(X_train, z_train, args, "MSE", "none", (X_test, z_test))
+
+    data = defaultdict(lambda: np.zeros(shape, dtype=float))
+    for name, X_, z_ in [("train", X_train, z_train), ("test", X_test, z_test)]:
+        # Rescale data to obtain correct values
+        pred = utils.rescale_data(NN.predict(X_), z)
+        target = utils.rescale_data(z_, z)
+        mse = np.mean((target - pred) ** 2, axis=(-2, -1)).reshape(shape)
+        print(f'mse {name:<7}: ', mse.ravel())
+        data[f"{name} MSE"] = np.where(mse < 1, mse, np.nan)
+
+    if args.pred:
+        # Plot fitted surface of the first network with original data
+        X_ = utils.split_scale(X, z, 0, scaler)[0]  # Scale design matrix
+        z_pred = utils.rescale_data(NN.predict(X_)[0], z)
+        plot.surface_fit(z_pred, z, x, y, args)
+
+    print("\n"*3)
+    print(f"Best NN train prediction: {(train:=data['train MSE'])[(mn:=np.unravel_index(np.nanargmin(train), train.shape))]} for eta = {etas[mn[0]]}, lambda = {lmbs[mn[1]]}")
+    print(f"Best NN test prediction: {(test:=data['test MSE'])[(mn:=np.unravel_index(np.nanargmin(test), test.shape))]} for eta = {etas[mn[0]]}, lambda = {lmbs[mn[1]]}")
+    if args.history:
+        # MSE at each epoch, for the last lambda of every eta, as NN_regression
+        MSE = {name: NN.history[key].reshape(*shape, -1)[:, -1]
+               for name, key in [("train MSE", "train_mse"), ("test MSE", "test_mse")]}
+        plot.eta_epochs(MSE, args, vmax=0.07)
+    else:
+        plot.eta_lambda(data, args)
+
+
+def NN_classification_grid(args):
+    """
+    NN_classification, training all networks at once with -grid
+    """
+    import plot
+    etas = args.eta
+    lmbs = args.lmb
+    shape = (len(etas), len(lmbs))
+
+    dataset = utils.load_data(args)
+    z = utils.categorical(dataset.target.reshape(-1, 1))
+    scaler = get_scaler(args.scaling)
+    X_train, X_test, z_train, z_test = utils.split_scale(dataset.data, z, args.tts, scaler)
+
+    NN = train_grid(X_train, z_train, args, "cross_entropy", "softmax", (X_test, z_test))
+
+    data = {"train accuracy": NN.predict_accuracy(X_train, z_train).reshape(shape),
+            "test accuracy": NN.predict_accuracy(X_test, z_test).reshape(shape)}
+    print("Test accuracy: ", data["test accuracy"].ravel())
+
+    print(f"Best NN train prediction: {(train:=data['train accuracy'])[(mn:=np.unravel_index(np.nanargmax(train), train.shape))]} for eta = {etas[mn[0]]}, lambda = {lmbs[mn[1]]}")
+    print(f"Best NN test prediction: {(test:=data['test accuracy'])[(mn:=np.unravel_index(np.nanargmax(test), test.shape))]} for eta = {etas[mn[0]]}, lambda = {lmbs[mn[1]]}")
+
+    if args.history:
+        # Accuracy at each epoch, for the last lambda of every eta, as NN_classification
+        train_data = {name: NN.history[key].reshape(*shape, -1)[:, -1]
+                      for name, key in [("train accuracy", "train_accuracy"), ("test accuracy", "test_accuracy")]}
+        plot.eta_epochs(train_data, args, vmax=1, vmin=0)
+    else:
+        plot.eta_lambda(data, args, NN=True)
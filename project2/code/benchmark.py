@@ -0,0 +1,240 @@
+"""
+Benchmarks of the neural network training.
+Run with python3 benchmark.py -h to see the options.
+"""
+import argparse
+import time
+import numpy as np
+import utils
+from analysis import get_scaler
+from NeuralNetwork import FFNN
+
+
+def autograd_functions(activation):
+    """
+    Returns the activation, softmax and cost functions written with
+    autograd.numpy. FFNN differentiates these with autograd,
+    as it did for every function before the analytic derivatives.
+    """
+    import autograd.numpy as anp
+
+    def sigmoid(x):
+        return 1 / (1 + anp.exp(-x))
+
+    def tanh(x):
+        return anp.tanh(x)
+
+    def relu(x):
+        return anp.where(x > 0, x, 0)
+
+    def leaky_relu(x, leak=0.01):
+        return anp.where(x > 0, x, leak * x)
+
+    def softmax(x):
+        exp = anp.exp(x)
+        return exp / anp.sum(exp, axis=1, keepdims=True)
+
+    def linear(x):
+        return x
+
+    def MSE(t_, t):
+        return (t_ - t)**2 / len(t)
+
+    def cross_entropy(t_, t):
+        return -(t * anp.log(t_) + (1 - t) * anp.log(1 - t_))
+
+    funcs = {"sigmoid": sigmoid, "tanh": tanh, "relu": relu, "leaky_relu": leaky_relu,
+             "softmax": softmax, "none": linear, "MSE": MSE, "cross_entropy": cross_entropy}
+    return funcs[activation], funcs
+
+
+def get_data(dataset, args):
+    """ Returns the scaled X_train and z_train of dataset, and the output activation and cost """
+    data_args = argparse.Namespace(dataset=dataset, num_points=args.num_points, epsilon=0.2, history=False)
+    if dataset == "Franke":
+        x, y, z = utils.load_data(data_args)
+        X = utils.create_X(x, y, 1, intercept=False)
+        output, cost = "none", "MSE"
+    else:
+        digits = utils.load_data(data_args)
+        X, z = digits.data, utils.categorical(digits.target)
+        output, cost = "softmax", "cross_entropy"
+    X_train, X_test, z_train, z_test = utils.split_scale(X, z, 0.2, get_scaler("S"))
+    return data_args, X_train, z_train, output, cost
+
+
+def train(X, z, data_args, args, activation, output, cost):
+    """
+    Trains a network for args.num_epochs epochs from seed 2021.
+    The weights are drawn without initialization by activation,
+    as it is not known for functions supplied by the user.
+    Returns the wall time per epoch, and the network
+    """
+    np.random.seed(2021)
+    NN = FFNN(X, z, data_args,
+              hidden_nodes=args.hidden_nodes,
+              batch_size=args.batch_size,
+              learning_rate=args.eta,
+              activation=activation,
+              cost=cost,
+              output_activation=output,
+              wi=False,
+              )
+    t0 = time.perf_counter()
+    NN.train(args.num_epochs)
+    return (time.perf_counter() - t0) / args.num_epochs, NN
+
+
+def bench_derivatives(args):
+    """
+    Compares training with the analytic derivatives of cost_activation.py
+    to training with derivatives found by autograd, on Franke and MNIST.
+    Both are trained from the same initial weights and shuffles,
+    so the weights should agree to round-off.
+    """
+    rows = []
+    for dataset in ["Franke", "MNIST"]:
+        data_args, X, z, output, cost = get_data(dataset, args)
+        for activation in args.act_funcs:
+            ag_activation, ag_funcs = autograd_functions(activation)
+            t_ag, NN_ag = train(X, z, data_args, args, ag_activation, ag_funcs[output], ag_funcs[cost])
+            t_an, NN_an = train(X, z, data_args, args, activation, output, cost)
+            diff = max(np.max(abs(w_an - w_ag)) for w_an, w_ag in zip(NN_an.weights[1:], NN_ag.weights[1:]))
+            rows.append((dataset, activation, t_ag, t_an, diff))
+
+    print(f"{'dataset':>8} {'activation':>11} {'autograd [ms/epoch]':>20} "
+          f"{'analytic [ms/epoch]':>20} {'speedup':>8} {'max |dW|':>10}")
+    for dataset, activation, t_ag, t_an, diff in rows:
+        print(f"{dataset:>8} {activation:>11} {1e3 * t_ag:>20.2f} {1e3 * t_an:>20.2f} "
+              f"{t_ag / t_an:>8.2f} {diff:>10.2e}")
+
+
+def bench_finite_differences(args):
+    """
+    Checks the analytic derivatives of cost_activation.py against central
+    finite differences with step -fd-step, at normally distributed points.
+    Softmax is checked against the diagonal of its Jacobian, which softmax_der
+    returns, by perturbing one column at a time.
+    Fails if the largest difference, relative to the largest finite difference,
+    is above -fd-tol.
+    """
+    from cost_activation import Activations, Costs
+    h = args.fd_step
+    x = np.random.normal(size=(50, 4))
+    activations = Activations()
+    costs = Costs()
+    costs.t = np.random.randint(2, size=x.shape)
+    t_ = np.random.uniform(0.1, 0.9, size=x.shape)  # Inside the domain of cross entropy
+
+    rows = []
+    for name in ["sigmoid", "tanh", "relu", "leaky_relu", "linear"]:
+        func = getattr(activations, name)
+        analytic = activations.activation_derivative(func)(x, func(x))
+        numeric = (func(x + h) - func(x - h)) / (2 * h)
+        rows.append((name, analytic, numeric))
+
+    func = activations.softmax
+    analytic = activations.activation_derivative(func)(x, func(x))
+    numeric = np.empty_like(x)
+    for j in range(x.shape[1]):
+        dx = np.zeros(x.shape[1])
+        dx[j] = h
+        numeric[:, j] = (func(x + dx)[:, j] - func(x - dx)[:, j]) / (2 * h)
+    rows.append(("softmax", analytic, numeric))
+
+    for name in ["MSE", "cross_entropy"]:
+        func = getattr(costs, name)
+        analytic = costs.cost_derivative(func)(t_)
+        numeric = (func(t_ + h) - func(t_ - h)) / (2 * h)
+        rows.append((name, analytic, numeric))
+
+    print(f"{'function':>14} {'max rel diff':>13}")
+    failed = []
+    for name, analytic, numeric in rows:
+        diff = np.max(np.abs(analytic - numeric)) / np.max(np.abs(numeric))
+        if diff > args.fd_tol:
+            failed.append(name)
+        print(f"{name:>14} {diff:>13.2e}")
+    assert not failed, f"Derivatives of {', '.join(failed)} differ from finite differences by more than {args.fd_tol}"
+
+
+benchmarks = {"derivatives": bench_derivatives, "finite_differences": bench_finite_differences}
+
+
+def parse_args(args=None):
+    """
+    Uses argparse module to return an object containing
+    all runtime arguments specified in command line
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the training of the neural network',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    add_arg = parser.add_argument
+
+    add_arg('-b', '--benchmarks',
+            type=str,
+            default="derivatives,finite_differences",
+            help=f'Benchmarks to run, comma separated, from {list(benchmarks)}',
+            )
+
+    add_arg('-n', '--num_points',
+            type=int,
+            default=30,
+            help='Number of gridpoints along 1 axis of the Franke data',
+            )
+
+    add_arg('-Ne', '--num_epochs',
+            type=int,
+            default=20,
+            help='Number of epochs trained',
+            )
+
+    add_arg('-eta',
+            type=float,
+            default=0.05,
+            help='Learning rate',
+            )
+
+    add_arg('-bs', '--batch_size',
+            type=int,
+            default=36,
+            help='Size of minibatch',
+            )
+
+    add_arg("-hn", "--hidden_nodes",
+            type=str,
+            default="10,10",
+            help="Number of nodes in each hidden layer",
+            )
+
+    add_arg("-act_funcs",
+            type=str,
+            default="sigmoid,tanh,relu",
+            help="Activation functions of the hidden layers, comma separated",
+            )
+
+    add_arg("-fd-step",
+            type=float,
+            default=1e-6,
+            help="Step of the finite differences",
+            )
+
+    add_arg("-fd-tol",
+            type=float,
+            default=1e-6,
+            help="Largest relative difference of the analytic derivatives from finite differences",
+            )
+
+    args = parser.parse_args(args)
+    args.benchmarks = args.benchmarks.split(",")
+    args.hidden_nodes = [int(i) for i in args.hidden_nodes.split(",")]
+    args.act_funcs = args.act_funcs.split(",")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for name in args.benchmarks:
+        np.random.seed(2021)
+        benchmarks[name](args)
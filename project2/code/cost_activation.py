@@ -1,7 +1,33 @@
 """
-This file contains cost and activation functions used in the code
+This file contains cost and activation functions used in the code,
+and their derivatives.
+The derivative of an activation takes both its input x and its output a,
+so those of sigmoid and tanh are found from the output of the forward pass.
+The activations and derivatives write into out if given,
+so a network can reuse its buffers instead of allocating new arrays.
+Functions supplied by the user are differentiated with autograd,
+and must then be written with autograd.numpy.
 """
-import autograd.numpy as np
+from functools import wraps
+import numpy as np
+
+
+def autograd_derivative(func):
+    """ Returns the elementwise derivative of func, found by autograd """
+    from autograd import elementwise_grad
+    return elementwise_grad(func)
+
+
+def with_out(func):
+    """ Wraps func, supplied by the user, to write into out if given, as the functions below """
+    @wraps(func)
+    def wrapped(*args, out=None):
+        if out is None:
+            return func(*args)
+        out[...] = func(*args)
+        return out
+    return wrapped
+
 
 class Costs:
     def MSE(self, t_):
@@ -12,25 +38,98 @@ class Costs:
         a = -(self.t * np.log(t_) + (1 - self.t) * np.log(1 - t_))
         return a
 
+    def MSE_der(self, t_, out=None):
+        out = np.subtract(t_, self.t, out=out)
+        out *= 2 / len(self.t)
+        return out
+
+    def cross_entropy_der(self, t_, out=None):
+        out = np.subtract(t_, self.t, out=out)
+        out /= t_ * (1 - t_)
+        return out
+
+    def cost_derivative(self, cost):
+        """
+        Returns the derivative of cost, taking the output layer.
+        Analytic for the costs above, else found with autograd.
+        """
+        if getattr(cost, "__self__", None) is self:
+            return getattr(self, cost.__name__ + "_der")
+        return with_out(autograd_derivative(cost))
+
 
 class Activations:
-    def sigmoid(self, x):
-        return 1 / (1 + np.exp(-x))
+    def sigmoid(self, x, out=None):
+        out = np.negative(x, out=out)
+        np.exp(out, out=out)
+        out += 1
+        return np.reciprocal(out, out=out)
 
-    def tanh(self, x):
-        return np.tanh(x)
+    def tanh(self, x, out=None):
+        return np.tanh(x, out=out)
 
-    def relu(self, x):
-        return np.where(x > 0, x, 0)
+    def relu(self, x, out=None):
+        return np.maximum(x, 0, out=out)
 
-    def leaky_relu(self, x, leak=0.01):
-        return np.where(x > 0, x, leak * x)
+    def leaky_relu(self, x, leak=0.01, out=None):
+        # leak * x is the largest for negative x, as leak < 1
+        out = np.multiply(x, leak, out=out)
+        return np.maximum(x, out, out=out)
 
-    def softmax(self, x):
-        exp = np.exp(x)
-        s = np.sum(exp, axis=1, keepdims=True)
-        return exp/s
+    def softmax(self, x, out=None):
+        out = np.exp(x, out=out)
+        out /= np.sum(out, axis=-1, keepdims=True)
+        return out
 
-    def linear(self, x):
+    def linear(self, x, out=None):
         # No activation
-        return x
+        if out is None:
+            return x
+        out[...] = x
+        return out
+
+    def sigmoid_der(self, x, a, out=None):
+        out = np.subtract(1, a, out=out)
+        out *= a
+        return out
+
+    def tanh_der(self, x, a, out=None):
+        out = np.square(a, out=out)
+        return np.subtract(1, out, out=out)
+
+    def relu_der(self, x, a, out=None):
+        if out is None:
+            out = np.empty_like(x)
+        return np.greater(x, 0, out=out)
+
+    def leaky_relu_der(self, x, a, leak=0.01, out=None):
+        out = self.relu_der(x, a, out=out)
+        out *= 1 - leak
+        out += leak
+        return out
+
+    def softmax_der(self, x, a, out=None):
+        """
+        Diagonal of the Jacobian of softmax, a (1 - a), used as its elementwise
+        derivative. Softmax with cross entropy uses the exact gradient instead.
+        autograd's elementwise_grad, used before, gives the sums of the rows of
+        the Jacobian, which are 0, so softmax output layers with other costs
+        did not learn, and now do.
+        """
+        return self.sigmoid_der(x, a, out=out)
+
+    def linear_der(self, x, a, out=None):
+        if out is None:
+            return np.ones_like(x)
+        out.fill(1)
+        return out
+
+    def activation_derivative(self, activation):
+        """
+        Returns the derivative of activation, taking its input x and output a.
+        Analytic for the activations above, else found with autograd from x.
+        """
+        if getattr(activation, "__self__", None) is self:
+            return getattr(self, activation.__name__ + "_der")
+        grad = with_out(autograd_derivative(activation))
+        return lambda x, a, out=None: grad(x, out=out)
@@ -1,4 +1,8 @@
 import argparse
+import sys
+import time
+import subprocess
+from collections import defaultdict
 from analysis import NN_classification, NN_regression, linear_regression, logistic_regression
 import numpy as np
 
@@ -74,6 +78,13 @@ def parse_args(args=None):
             help='Set size of minibatch'
             )
 
+    add_arg('-sampling',
+            type=str,
+            default='shuffle',
+            choices=['shuffle', 'sequential', 'replacement'],
+            help='How minibatches are drawn: shuffled without replacement, in order, or with replacement',
+            )
+
     add_arg('-s', '--scaling',
             type=str,
             default='S',
@@ -116,6 +127,12 @@ def parse_args(args=None):
             help="activation function used in hidden layers",
             ) 
 
+    add_arg("-grid",
+            action="store_true",
+            dest="grid",
+            help="Train the neural networks of all etas and lambdas at once",
+            )
+
     add_arg("-d", "--dataset",
             type=str,
             default="Franke",
@@ -136,6 +153,18 @@ def parse_args(args=None):
             dest="history",
             )
 
+    add_arg("-history-every",
+            type=int,
+            default=1,
+            help="Calculate the training history every this many epochs",
+            )
+
+    add_arg("-history-points",
+            type=int,
+            default=0,
+            help="Calculate the training history on this many random train and test points. 0 for all",
+            )
+
     add_arg("-show",
             action="store_true",
             dest="show",
@@ -157,6 +186,11 @@ def parse_args(args=None):
             help="Random seed. If 0, no seed is used"
             )
 
+    add_arg("--profile-startup",
+            action="store_true",
+            help="Run, and report the time spent importing each package",
+            )
+
     args = parser.parse_args(args)
 
     print("Runtime arguments:", args, "\n")
@@ -175,7 +209,36 @@ def parse_args(args=None):
     return args
 
 
+def profile_startup(argv):
+    """
+    Reruns the command with python -X importtime, and prints the time spent
+    importing each top-level package, both at startup and later by the analysis.
+
+    Args:
+        argv, list: command line, as sys.argv, without --profile-startup
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - t0
+
+    times = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or not fields[1].strip().isdigit():
+            print(line, file=sys.stderr)  # Not import timing
+        elif not fields[2].startswith("  "):  # Imported by the program, not by another package
+            times[fields[2].strip().split(".")[0]] += int(fields[1]) / 1e6
+
+    print(f"{'package':>20} {'import [s]':>11}")
+    for name, t in sorted(times.items(), key=lambda item: -item[1])[:15]:
+        print(f"{name:>20} {t:>11.3f}")
+    print(f"{'total':>20} {sum(times.values()):>11.3f}, of {wall:.3f} s wall time")
+
+
 def main():
+    if "--profile-startup" in sys.argv:
+        profile_startup([arg for arg in sys.argv if arg != "--profile-startup"])
+        return
     args = parse_args()
     if args.seed:
         np.random.seed(args.seed)
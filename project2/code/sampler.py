@@ -0,0 +1,53 @@
+"""
+Minibatches for the training loops of the neural network and SGD.
+Instead of a shuffled copy of the whole training set every epoch,
+the rows of each batch are gathered into buffers reused for every batch.
+"""
+import numpy as np
+
+
+class Sampler:
+    """
+    Splits the rows of arrays into minibatches every epoch, by mode:
+     - sequential: in order, as views of the arrays, without copying
+     - shuffle: without replacement, from a permutation shuffled in place
+       every epoch. Gives the same batches as shuffling an index array
+       with np.random.shuffle and slicing the arrays indexed by it
+     - replacement: every batch drawn with replacement
+    The batches of shuffle and replacement are overwritten by the next batch.
+    """
+    modes = ["shuffle", "sequential", "replacement"]
+
+    def __init__(self, arrays, batch_size, mode="shuffle"):
+        """
+        Args:
+            arrays, list of ndarrays: sampled by the same rows, like X and z
+            batch_size, int: rows in every batch, the last may be smaller.
+                If 0 or None, all rows
+            mode, str: one of Sampler.modes
+        """
+        if mode not in self.modes:
+            raise ValueError(f"Unknown sampling mode {mode}, use one of {self.modes}")
+        self.arrays = arrays
+        self.N = len(arrays[0])
+        self.batch_size = self.N if batch_size in [0, None] else int(batch_size)
+        self.mode = mode
+        self.inds = np.arange(self.N)
+        self.buffers = [np.empty((min(self.batch_size, self.N), *np.shape(a)[1:]), dtype=np.result_type(a))
+                        for a in arrays] if mode != "sequential" else None
+
+    def gather(self, rows):
+        """ Returns the rows of every array, written into the buffers """
+        return [np.take(a, rows, axis=0, out=buf[:len(rows)]) for a, buf in zip(self.arrays, self.buffers)]
+
+    def epoch(self):
+        """ Yields the batches of one epoch, a list with the rows of every array """
+        if self.mode == "shuffle":
+            np.random.shuffle(self.inds)
+        for i in range(0, self.N, self.batch_size):
+            if self.mode == "sequential":
+                yield [a[i: i + self.batch_size] for a in self.arrays]
+            elif self.mode == "shuffle":
+                yield self.gather(self.inds[i: i + self.batch_size])
+            else:
+                yield self.gather(np.random.randint(0, self.N, size=min(self.batch_size, self.N - i)))
@@ -2,8 +2,6 @@
 Many useful support functions, mainly to treat data
 """
 import numpy as np
-from sklearn.model_selection import train_test_split as tts
-from sklearn.datasets import load_breast_cancer, load_digits
 
 
 def get_features(i):
@@ -33,9 +31,11 @@ def load_data(args):
         return x, y, z
 
     elif args.dataset == "Cancer":
+        from sklearn.datasets import load_breast_cancer
         return load_breast_cancer()
 
     elif args.dataset == "MNIST":
+        from sklearn.datasets import load_digits
         return load_digits()
 
 
@@ -64,6 +64,11 @@ def create_X(x, y, n, intercept=True):
     """
     Sets up design matrix
 
+    Every power of x and y is computed once, and the columns
+    are formed as products of these cached powers, written into
+    a preallocated Fortran-ordered (column-major) array.
+    The column ordering is 1, x, y, x^2, xy, y^2, ...
+
     Parameters:
         x, y: array-like
             Are flattened if not already
@@ -82,18 +87,27 @@ def create_X(x, y, n, intercept=True):
         else:
             return X[:, 1:]
 
-    if not 1 in x.shape:
-        x = np.ravel(x)
-        y = np.ravel(y)
+    x = np.ravel(x)
+    y = np.ravel(y)
 
     N = len(x)
     l = get_features(n)  # Number of elements in beta
-    X = np.ones((N, l))
+    X = np.empty((N, l), order="F")
+
+    # Column i holds x**i and y**i respectively
+    x_pow = np.empty((N, n + 1), order="F")
+    y_pow = np.empty((N, n + 1), order="F")
+    x_pow[:, 0] = 1
+    y_pow[:, 0] = 1
+    for i in range(1, n + 1):
+        np.multiply(x_pow[:, i - 1], x, out=x_pow[:, i])
+        np.multiply(y_pow[:, i - 1], y, out=y_pow[:, i])
 
+    X[:, 0] = 1
     for i in range(1, n + 1):
         q = i * (i + 1) // 2
-        for k in range(i + 1):
-            X[:, q + k] = (x ** (i - k)) * (y ** k)
+        # x^i y^0, x^(i-1) y^1, ..., x^0 y^i
+        np.multiply(x_pow[:, i::-1], y_pow[:, :i + 1], out=X[:, q:q + i + 1])
     if intercept:
         return X
     else:
@@ -135,6 +149,7 @@ def split_scale(X, z, ttsplit, scaler):
     """
 
     if ttsplit != 0:
+        from sklearn.model_selection import train_test_split as tts
         X_train, X_test, z_train, z_test = tts(X, z, test_size=ttsplit)
     else:
         X_train = X
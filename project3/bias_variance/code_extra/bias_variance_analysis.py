@@ -46,8 +46,8 @@ def run_linear_regression(bs_model, fig, ax, args):
     for d in range(1, args.nr_complexity+1):
         pipe_model = make_pipeline(PolynomialFeatures(degree=d), linreg_model)
 
-        t_tilde, t_pred = bs_model.simulate(pipe_model)
-        mse, bias, var = bs_model.mse_decomposition(t_pred)
+        train_stats, test_stats = bs_model.simulate(pipe_model)
+        mse, bias, var = bs_model.mse_decomposition(test_stats)
 
         mse_all[d] = mse
         bias_all[d] = bias
@@ -92,8 +92,8 @@ def run_neural_network(bs_model, fig, ax, args):
     for h in args.nr_hidden_layers_nodes:
         model_nn = MLPRegressor(hidden_layer_sizes=h, alpha=args.regularization, learning_rate_init=0.01)
 
-        t_tilde, t_pred = bs_model.simulate(model_nn)
-        mse, bias, var = bs_model.mse_decomposition(t_pred)
+        train_stats, test_stats = bs_model.simulate(model_nn)
+        mse, bias, var = bs_model.mse_decomposition(test_stats)
 
         mse_all[h] = mse
         bias_all[h] = bias
@@ -131,8 +131,8 @@ def run_support_vector_machine(bs_model, fig, ax, args):
         for e in epsilons:
             svm_model = SVR(kernel=args.kernel, C=c, epsilon=e)
 
-            t_tilde, t_pred = bs_model.simulate(svm_model)
-            mse, bias, var = bs_model.mse_decomposition(t_pred)
+            train_stats, test_stats = bs_model.simulate(svm_model)
+            mse, bias, var = bs_model.mse_decomposition(test_stats)
 
             mse_all[(c,e)] = mse
             bias_all[(c,e)] = bias
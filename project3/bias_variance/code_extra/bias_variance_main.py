@@ -62,6 +62,12 @@ def parse_args(args=None):
                 help='Threshold value for ignoring residuals in optimization.\
                         Larger => more bias (more residuals ignored)')
 
+    add_arg("-report",
+            type=int,
+            default=0,
+            help="Print the test scores every this many bootstraps, to follow their convergence. 0 for never",
+            )
+
     add_arg("-show",
             action="store_true",
             dest="show",
@@ -94,7 +100,7 @@ def main():
     if args.seed:
         np.random.seed(args.seed)
 
-    boot = Bootstrap(x,y,z, args, scale_target=True)
+    boot = Bootstrap(x,y,z, args, scale_target=True, report=args.report)
 
     fig, ax = plt.subplots(figsize=[10, 5])
 
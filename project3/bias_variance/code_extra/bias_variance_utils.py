@@ -1,33 +1,39 @@
 import numpy as np
 
-def MSE(target, pred):
-    """Returns mean squared error between target and prediction.
-    
-    Args:
-        target (array): target function
-        pred (array): predictions
-        
-    """ 
-    return np.mean(np.mean((target - pred)**2, axis=1, keepdims=True))
+class BiasVariance:
+    """Running mean and variance of the prediction of every point over bootstraps,
+    updated with Welford's algorithm after each fit. Only O(points) is stored,
+    instead of the predictions of every bootstrap.
+    """
 
-def bias(target, pred):
-    """Returns bias of prediction.
-    
-    Args:
-        target (array): target function
-        pred (array): predictions
-        
-    """ 
-    return np.mean((target - np.mean(pred, axis=1, keepdims=True))**2)
+    def __init__(self):
+        self.count = 0
+        self.mean = 0
+        self.M2 = 0 # Sum of squared deviations from the mean
 
-def variance(pred):
-    """Returns variance of prediction.
-    
-    Args:
-        pred (array): predictions
+    def update(self, pred):
+        """Adds the predictions of one bootstrap.
+
+        Args:
+            pred (array): predictions
+            
+        """
+        self.count += 1
+        delta = pred - self.mean
+        self.mean = self.mean + delta / self.count
+        self.M2 = self.M2 + delta * (pred - self.mean)
+
+    def scores(self, target):
+        """Returns mean squared error, bias and variance of the predictions so far.
+        The mean squared error over all bootstraps is the bias plus the variance.
         
-    """ 
-    return np.mean((pred - np.mean(pred, axis=1, keepdims=True))**2)
+        Args:
+            target (array): target function
+            
+        """
+        bias = np.mean((np.ravel(target) - self.mean)**2)
+        variance = np.mean(self.M2) / self.count
+        return bias + variance, bias, variance
 
 def xyz_1D(x, y, z):
     """Create mesh from inputs, and reshape inputs and outputs to vectors.
@@ -1,11 +1,11 @@
 from bias_variance_utils import *
+import inspect
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import MinMaxScaler, StandardScaler, PolynomialFeatures
-from sklearn.utils import resample
 
 from warnings import simplefilter
 from sklearn.exceptions import ConvergenceWarning
@@ -21,13 +21,50 @@ def FrankeFunction(x,y, noise_std=0.2, add_noise=False):
     return term1 + term2 + term3 + term4 + noise
 
 
+# Preprocessing steps whose fit only depends on the number of features,
+# so they need no sample weights
+STATELESS_STEPS = ('PolynomialFeatures', 'FunctionTransformer')
+
+
+def sample_weight_args(model):
+    """Names of the fit arguments taking sample weights, or None if they cannot be used.
+    Only linear models are fitted with weights, as for them integer weights give
+    the same fit as repeated rows. SVR (gamma='scale') and MLPRegressor (minibatches)
+    depend on the rows themselves.
+    In a pipeline, every step taking sample weights is given them, like StandardScaler.
+    A step fitted to the data without taking them, like MinMaxScaler,
+    would be fitted to rows not drawn, so then None is returned.
+
+    Args:
+        model: model from scikit library, or a pipeline ending in one
+
+    Returns:
+        (list): ['sample_weight'], or '<step>__sample_weight' of the weighted steps of a pipeline
+    """
+    steps = model.steps if hasattr(model, 'steps') else [(None, model)]
+    estimator = steps[-1][1]
+    if (not type(estimator).__module__.startswith('sklearn.linear_model')
+            or 'sample_weight' not in inspect.signature(estimator.fit).parameters):
+        return None
+
+    args = []
+    for name, step in steps:
+        if step is None or step == 'passthrough' or type(step).__name__ in STATELESS_STEPS:
+            continue
+        if 'sample_weight' not in inspect.signature(step.fit).parameters:
+            return None
+        args.append('sample_weight' if name is None else f'{name}__sample_weight')
+    return args
+
+
 class Bootstrap:
 
-    def __init__(self, x, y, t, args, nr_boot=100, scaler=StandardScaler, scale_target=True):
+    def __init__(self, x, y, t, args, nr_boot=100, scaler=StandardScaler, scale_target=True, report=0):
         """
         x (array): first input dimension
         y (array): second input dimension
         t (array): targets
+        report (int): print the test scores every report bootstraps, 0 for never
         """
         self.x_1d, self.y_1d, self.t_1d = xyz_1D(x, y, t) # Flatten targets
 
@@ -35,6 +72,7 @@ class Bootstrap:
         self.scaler = scaler
         self.scale_target = scale_target
         self.nr_boot = nr_boot
+        self.report = report
 
         self.X_train, self.X_test, self.t_train, self.t_test \
                     = train_test_split(self.X, self.t_1d, test_size=0.2, random_state=args.seed)
@@ -63,33 +101,51 @@ class Bootstrap:
     
     def simulate(self, model):
         """
+        Linear models are fitted to all training data, with each row weighted
+        by how many times it is drawn, instead of to a resampled copy, see sample_weight_args.
+        The rows are drawn as by sklearn's resample, so the samples are the same.
+        The predictions are accumulated as the bootstraps are fitted,
+        so memory does not grow with the number of bootstraps.
+
         Args:
             model: model from scikit library
-            B: number of bootstraps
+
+        Returns:
+            train_stats (BiasVariance): statistics of the predictions of the training data
+            test_stats (BiasVariance): statistics of the predictions of the test data
         """
         X_train, X_test, t_train, t_test = self.X_train, self.X_test, self.t_train, self.t_test
-        t_tilde = np.zeros((t_train.shape[0], self.nr_boot))
-        t_pred = np.zeros((t_test.shape[0], self.nr_boot))
+        train_stats = BiasVariance()
+        test_stats = BiasVariance()
 
         if len(t_train.shape) > 1:
             t_train = t_train.ravel()
         if len(t_test.shape) > 1:
             t_test = t_test.ravel()
         
+        weight_args = sample_weight_args(model)
+        n = X_train.shape[0]
         for i in range(self.nr_boot): # Amounts of bootstraps to perform
-            X_boot, t_boot = resample(X_train, t_train)
-        
-            model.fit(X_boot, t_boot)
-            t_tilde[:,i] = model.predict(X_train) # reshape to get same dimension as targets
-            t_pred[:,i] = model.predict(X_test)
-
-        return t_tilde, t_pred
+            idx = np.random.randint(0, n, size=n)
+            if weight_args is not None:
+                counts = np.bincount(idx, minlength=n)
+                model.fit(X_train, t_train, **{arg: counts for arg in weight_args})
+            else:
+                model.fit(X_train[idx], t_train[idx])
+            train_stats.update(model.predict(X_train))
+            test_stats.update(model.predict(X_test))
+            if self.report and (i + 1) % self.report == 0:
+                mse, bias, var = test_stats.scores(t_test)
+                print(f"Bootstraps: {i + 1}, test MSE: {mse:.6f}, bias: {bias:.6f}, variance: {var:.6f}")
+
+        return train_stats, test_stats
+
+    def mse_decomposition(self, test_stats):
+        """Returns test MSE, bias and variance.
 
-    def mse_decomposition(self, t_pred):
-        mse_test = MSE(self.t_test, t_pred)
-        bias_test = bias(self.t_test, t_pred)
-        var_test = variance(t_pred)
-
-        return mse_test, bias_test, var_test
+        Args:
+            test_stats (BiasVariance): from simulate
+        """
+        return test_stats.scores(self.t_test)
 
 
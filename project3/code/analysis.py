@@ -1,9 +1,9 @@
 import numpy as np
-from tqdm import tqdm
-import plot
-from PINN import PINN
-import NN_eig
-import tensorflow as tf
+# TensorFlow takes seconds to import, so it is only imported by the
+# neural network methods, and forward Euler starts quickly.
+# plot (matplotlib) and tqdm are imported where they are used, so the
+# command line starts without them. plot is imported before TensorFlow,
+# as it sets TensorFlow's log level
 
 
 def IC(x):
@@ -24,6 +24,8 @@ def forward_euler(args):
         u (array): numerical solution for all time steps
 
     """
+    from tqdm import tqdm
+    import plot
     #Importing stuff from argparse
     T = args.tot_time
     dx = args.x_step
@@ -96,6 +98,9 @@ def neural_network(args):
         args (argparse): Information handled by the argparser 
 
     """
+    from tqdm import tqdm
+    import plot
+    from PINN import PINN
     # Setup of Neural Network
     #set default values
     tmin = 0.
@@ -141,6 +146,9 @@ def neural_network_eig(args):
         args (argparse): Information handled by the argparser 
 
     """
+    import plot
+    import tensorflow as tf
+    import NN_eig
     n = args.dimension    # Dimension
     T = args.tot_time     # Final time
     
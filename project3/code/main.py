@@ -1,4 +1,8 @@
 import argparse
+import sys
+import time
+import subprocess
+from collections import defaultdict
 import numpy as np
 import analysis
 
@@ -168,12 +172,46 @@ def parse_args(args=None):
             default=2021,
             help="Random seed. If 0, no seed is used",
             )
+
+    add_arg("--profile-startup",
+            action="store_true",
+            help="Run, and report the time spent importing each package",
+            )
     args = parser.parse_args(args)
     print("Runtime arguments:", args, "\n")
     return args
 
 
+def profile_startup(argv):
+    """
+    Reruns the command with python -X importtime, and prints the time spent
+    importing each top-level package, both at startup and later by the analysis.
+
+    Args:
+        argv (list): command line, as sys.argv, without --profile-startup
+    """
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", *argv], stderr=subprocess.PIPE, text=True)
+    wall = time.perf_counter() - t0
+
+    times = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        fields = line.split("|")
+        if not line.startswith("import time:") or not fields[1].strip().isdigit():
+            print(line, file=sys.stderr)  # Not import timing
+        elif not fields[2].startswith("  "):  # Imported by the program, not by another package
+            times[fields[2].strip().split(".")[0]] += int(fields[1]) / 1e6
+
+    print(f"{'package':>20} {'import [s]':>11}")
+    for name, t in sorted(times.items(), key=lambda item: -item[1])[:15]:
+        print(f"{name:>20} {t:>11.3f}")
+    print(f"{'total':>20} {sum(times.values()):>11.3f}, of {wall:.3f} s wall time")
+
+
 def main():
+    if "--profile-startup" in sys.argv:
+        profile_startup([arg for arg in sys.argv if arg != "--profile-startup"])
+        return
     args = parse_args()
     if args.seed:
         np.random.seed(args.seed)